@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Benchmark do Buscador de Casas - São João del Rei
+Mede parse, extração, normalização de preços e geração de relatório sobre páginas salvas em disco (sem rede)
+
+Uso:
+  python benchmark_sjdr.py                  Roda o benchmark e compara com o baseline
+  python benchmark_sjdr.py --save-baseline  Roda e grava os tempos como novo baseline
+  python benchmark_sjdr.py --record         Salva as páginas atuais dos sites ativos como fixtures
+  python benchmark_sjdr.py --repeat N       Número de repetições por etapa (padrão: 5)
+
+Também mede o tempo de import e de --list-sites em processos novos e falha se passar
+do orçamento STARTUP_BUDGETS ou se o import carregar requests/bs4/numpy/multiprocessing.
+"""
+
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+from house_finder_sjdr import HouseFinder, LearnedSelectors, iter_embedded_listings, normalize_prices
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+FIXTURES_DIR = os.path.join(BENCHMARK_DIR, 'fixtures')
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# Piora acima deste percentual em relação ao baseline é tratada como regressão
+REGRESSION_THRESHOLD = 0.20
+
+SYNTHETIC_CARDS = 60
+
+# Orçamento de inicialização (segundos além do interpretador Python vazio)
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'house_finder_sjdr.py')
+STARTUP_BUDGETS = {'import': 0.080, 'list_sites': 0.120}
+HEAVY_MODULES = ('requests', 'bs4', 'soupsieve', 'lxml', 'numpy', 'multiprocessing')
+
+
+def element_for_selector(selector: str, content: str, tag: str = 'div') -> str:
+    """Monta um elemento HTML que casa com um seletor simples ('.classe', '[attr="valor"]' ou tag)"""
+    selector = selector.split(', ')[0].strip()
+    class_match = re.fullmatch(r'\.([\w-]+)', selector)
+    attr_match = re.fullmatch(r'\[([\w-]+)="([^"]*)"\]', selector)
+    if class_match:
+        return f'<{tag} class="{class_match.group(1)}">{content}</{tag}>'
+    if attr_match:
+        return f'<{tag} {attr_match.group(1)}="{attr_match.group(2)}">{content}</{tag}>'
+    if re.fullmatch(r'[a-z][a-z0-9]*', selector):
+        return f'<{selector}>{content}</{selector}>'
+    return f'<{tag}>{content}</{tag}>'
+
+
+def synthetic_page(site_name: str, site_config: Dict) -> bytes:
+    """Página sintética com cards no formato dos seletores do site (usada quando não há fixture gravada)"""
+    selectors = site_config['selectors']
+    neighborhoods = ['Centro', 'Segredo', 'Fábricas', 'Matosinhos']
+    cards = []
+    listings = []
+    for i in range(SYNTHETIC_CARDS):
+        price = 120000 + (i * 7919) % 300000
+        price_text = f"R$ {price:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+        neighborhood = neighborhoods[i % len(neighborhoods)]
+        title = f'Casa {i % 4 + 1} quartos à venda - {neighborhood}'
+        address = f'Rua {i}, {neighborhood}, São João del Rei - MG'
+        href = f'/imovel/{site_name}-{i}'
+        inner = (
+            f'<a href="{href}">' + element_for_selector(selectors['title'], title, 'h2') + '</a>'
+            + element_for_selector(selectors['price'], price_text)
+            + element_for_selector(selectors['address'], address)
+            + '<ul><li>90 m²</li><li>3 quartos</li><li>2 vagas</li></ul>'
+        )
+        cards.append(element_for_selector(selectors['property'], inner))
+        listings.append({
+            'listing': {
+                'title': title,
+                'pricingInfos': [{'businessType': 'SALE', 'price': str(price)}],
+                'address': {'street': f'Rua {i}', 'neighborhood': neighborhood, 'city': 'São João del Rei'},
+                'usableAreas': [90],
+                'bedrooms': [i % 4 + 1]
+            },
+            'link': {'href': href}
+        })
+
+    script = ''
+    if site_config.get('embedded_json'):
+        state = {'props': {'pageProps': {'search': {'result': {'listings': listings}}}}}
+        script = f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(state, ensure_ascii=False)}</script>'
+
+    # Marcação extra fora dos cards, como nos portais reais
+    filler = ''.join(f'<nav><ul>{"".join(f"<li><a href=/x{j}>Link {j}</a></li>" for j in range(20))}</ul></nav>' for _ in range(20))
+    html = f'<!DOCTYPE html><html><head><title>{site_name}</title>{script}</head><body>{filler}<main>{"".join(cards)}</main>{filler}</body></html>'
+    return html.encode('utf-8')
+
+
+def load_fixture(site_name: str, site_config: Dict):
+    """Retorna (conteúdo, origem) da página do site: gravada em disco ou sintética"""
+    path = os.path.join(FIXTURES_DIR, f'{site_name}.html')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read(), 'gravada'
+    return synthetic_page(site_name, site_config), 'sintética'
+
+
+def measure(func, repeat: int):
+    """Executa func `repeat` vezes; retorna (mediana em segundos, pico de memória em bytes, último resultado)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    # Memória medida numa execução à parte para o tracemalloc não distorcer os tempos
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, result
+
+
+def benchmark_site(finder: HouseFinder, site_name: str, site_config: Dict, content: bytes, repeat: int) -> Dict:
+    """Mede cada etapa do processamento de uma página do site"""
+    stages = {}
+
+    elapsed, peak, (soup, _) = measure(lambda: finder.make_soup(site_config, content, restrict=False), repeat)
+    stages['parse'] = (elapsed, peak)
+
+    elapsed, peak, cards = measure(lambda: finder.find_properties(site_name, site_config, soup), repeat)
+    stages['find_cards'] = (elapsed, peak)
+
+    def extract_all():
+        rejected = {}
+        rows = finder.extract_rows(site_name, site_config, cards, 0, rejected)
+        return finder.filter_listings(site_name, site_config, 0, rows, rejected)
+    elapsed, peak, _ = measure(extract_all, repeat)
+    stages['extract'] = (elapsed, peak)
+
+    title_selectors = site_config['selectors']['title']
+    elapsed, peak, _ = measure(lambda: [finder.extract_text_multi_selectors(card, title_selectors) for card in cards], repeat)
+    stages['extract_text_multi_selectors'] = (elapsed, peak)
+
+    price_texts = [finder.extract_text_multi_selectors(card, site_config['selectors']['price']) for card in cards]
+    elapsed, peak, _ = measure(lambda: [finder.clean_price(text) for text in price_texts], repeat)
+    stages['clean_price'] = (elapsed, peak)
+
+    elapsed, peak, _ = measure(lambda: normalize_prices(price_texts), repeat)
+    stages['normalize_prices'] = (elapsed, peak)
+
+    if site_config.get('embedded_json'):
+        elapsed, peak, _ = measure(lambda: list(iter_embedded_listings(content)), repeat)
+        stages['embedded_json'] = (elapsed, peak)
+
+    # Caminho completo usado pelo scraper (com os atalhos de strainer / JSON embutido)
+    page_url = site_config['search_url']
+    elapsed, peak, page_data = measure(lambda: finder.parse_page(site_name, site_config, page_url, PageStub(page_url, content), 0), repeat)
+    stages['parse_page'] = (elapsed, peak)
+
+    return {
+        'stages': {name: {'seconds': seconds, 'peak_bytes': peak_bytes} for name, (seconds, peak_bytes) in stages.items()},
+        'cards': page_data['cards'],
+        'listings': [listing for _, listing in page_data['listings']],
+        'listings_per_second': page_data['cards'] / stages['parse_page'][0] if stages['parse_page'][0] else 0.0
+    }
+
+
+class PageStub:
+    """Resposta mínima para alimentar parse_page a partir de uma fixture"""
+
+    def __init__(self, url: str, content: bytes):
+        self.url = url
+        self.content = content
+        self.status_code = 200
+
+
+def measure_startup(repeat: int) -> Dict:
+    """Mede import e --list-sites em processos novos, descontando o interpretador vazio"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(SCRIPT_PATH))
+    commands = {
+        'python': [sys.executable, '-c', 'pass'],
+        'import': [sys.executable, '-c', 'import house_finder_sjdr'],
+        'list_sites': [sys.executable, SCRIPT_PATH, '--list-sites'],
+    }
+    timings = {}
+    # Diretório temporário: --list-sites não deve criar arquivos na pasta do projeto
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, command in commands.items():
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.run(command, cwd=cwd, env=env, check=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                samples.append(time.perf_counter() - start)
+            timings[name] = statistics.median(samples)
+        check = (f'import sys, house_finder_sjdr; '
+                 f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))')
+        loaded = subprocess.run([sys.executable, '-c', check], cwd=cwd, env=env, check=True,
+                                capture_output=True, text=True).stdout.strip()
+    return {
+        'seconds': {name: max(0.0, timings[name] - timings['python']) for name in STARTUP_BUDGETS},
+        'heavy_modules': [m for m in loaded.split(',') if m],
+    }
+
+
+def check_startup(startup: Dict) -> List[str]:
+    """Lista os estouros do orçamento de inicialização"""
+    problems = []
+    for name, budget in STARTUP_BUDGETS.items():
+        elapsed = startup['seconds'][name]
+        if elapsed > budget:
+            problems.append(f"inicialização/{name}: {elapsed * 1000:.0f} ms (orçamento {budget * 1000:.0f} ms)")
+    if startup['heavy_modules']:
+        problems.append(f"inicialização/import carrega dependências pesadas: {', '.join(startup['heavy_modules'])}")
+    return problems
+
+
+def record_fixtures(finder: HouseFinder):
+    """Baixa a página de busca de cada site ativo e grava como fixture"""
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    finder.cache = None
+    for site_name, site_config in finder.sites.items():
+        if not site_config.get('active', True):
+            continue
+        try:
+            response = finder.fetch_page(site_name, site_config, site_config['search_url'])
+        except Exception as e:
+            print(f"❌ {site_name}: não foi possível gravar ({e})")
+            continue
+        if response is None:
+            print(f"❌ {site_name}: não foi possível gravar")
+            continue
+        path = os.path.join(FIXTURES_DIR, f'{site_name}.html')
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        print(f"💾 {site_name}: {len(response.content) / 1024:.0f} KB gravados em {path}")
+
+
+def compare_with_baseline(report: Dict, baseline: Dict) -> List[str]:
+    """Lista as etapas que ficaram mais lentas que o baseline além do limite"""
+    regressions = []
+    for site_name, site_report in report['sites'].items():
+        baseline_stages = baseline.get('sites', {}).get(site_name, {}).get('stages', {})
+        for stage, values in site_report['stages'].items():
+            previous = baseline_stages.get(stage, {}).get('seconds')
+            if previous and values['seconds'] > previous * (1 + REGRESSION_THRESHOLD):
+                regressions.append(f"{site_name}/{stage}: {previous * 1000:.2f} ms -> {values['seconds'] * 1000:.2f} ms")
+    for stage, values in report['global'].items():
+        previous = baseline.get('global', {}).get(stage, {}).get('seconds')
+        if previous and values['seconds'] > previous * (1 + REGRESSION_THRESHOLD):
+            regressions.append(f"{stage}: {previous * 1000:.2f} ms -> {values['seconds'] * 1000:.2f} ms")
+    return regressions
+
+
+def print_report(report: Dict, baseline: Dict):
+    print("\n" + "="*78)
+    print("⏱️ BENCHMARK - BUSCADOR DE CASAS")
+    print("="*78)
+    for site_name, site_report in report['sites'].items():
+        print(f"\n🌐 {site_name} (página {site_report['source']}, {site_report['cards']} cards, "
+              f"{site_report['listings_per_second']:,.0f} anúncios/s)")
+        baseline_stages = baseline.get('sites', {}).get(site_name, {}).get('stages', {})
+        for stage, values in site_report['stages'].items():
+            line = f"  • {stage:<30} {values['seconds'] * 1000:9.2f} ms  {values['peak_bytes'] / 1024:9.0f} KB pico"
+            previous = baseline_stages.get(stage, {}).get('seconds')
+            if previous:
+                line += f"  ({(values['seconds'] / previous - 1) * 100:+.0f}% vs baseline)"
+            print(line)
+
+    print("\n📄 Etapas globais:")
+    for stage, values in report['global'].items():
+        print(f"  • {stage:<30} {values['seconds'] * 1000:9.2f} ms  {values['peak_bytes'] / 1024:9.0f} KB pico")
+
+    print("\n🚀 Inicialização (além do interpretador vazio):")
+    for name, elapsed in report['startup']['seconds'].items():
+        print(f"  • {name:<30} {elapsed * 1000:9.2f} ms  (orçamento {STARTUP_BUDGETS[name] * 1000:.0f} ms)")
+
+
+def main():
+    """Executa o benchmark sobre as fixtures de todos os sites configurados"""
+    repeat = 5
+    if '--repeat' in sys.argv:
+        repeat = int(sys.argv[sys.argv.index('--repeat') + 1])
+
+    finder = HouseFinder()
+
+    if '--record' in sys.argv:
+        record_fixtures(finder)
+        return
+
+    # Sem rede nem cache: só o custo de CPU/memória do processamento
+    finder.cache = None
+    # Seletores aprendidos só em memória: as fixtures não podem mudar o que os scrapes reais usam
+    finder.learned_selectors = LearnedSelectors(path=None)
+
+    report = {'sites': {}, 'global': {}}
+    all_listings = []
+    for site_name, site_config in finder.sites.items():
+        content, source = load_fixture(site_name, site_config)
+        site_report = benchmark_site(finder, site_name, site_config, content, repeat)
+        site_report['source'] = source
+        all_listings.extend(site_report.pop('listings'))
+        report['sites'][site_name] = site_report
+
+    if all_listings:
+        elapsed, peak, _ = measure(lambda: finder.generate_html_report(all_listings), repeat)
+        report['global']['generate_html_report'] = {'seconds': elapsed, 'peak_bytes': peak}
+
+        def write_report():
+            with open(os.devnull, 'w', encoding='utf-8') as out:
+                finder.write_html_report(all_listings, out)
+        elapsed, peak, _ = measure(write_report, repeat)
+        report['global']['write_html_report'] = {'seconds': elapsed, 'peak_bytes': peak}
+
+    report['startup'] = measure_startup(repeat)
+    startup_problems = check_startup(report['startup'])
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    if startup_problems:
+        print("\n❌ Orçamento de inicialização estourado:")
+        for problem in startup_problems:
+            print(f"  • {problem}")
+        sys.exit(1)
+
+    if '--save-baseline' in sys.argv:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Baseline salvo em {BASELINE_FILE}")
+        return
+
+    if not baseline:
+        print("\nℹ️ Nenhum baseline encontrado - rode com --save-baseline para criar um")
+        return
+
+    regressions = compare_with_baseline(report, baseline)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regressões acima de {REGRESSION_THRESHOLD:.0%}:")
+        for regression in regressions:
+            print(f"  • {regression}")
+        sys.exit(1)
+    print("\n✅ Nenhuma regressão em relação ao baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,90 +1,1967 @@
-def search_all_sites(self) -> List[Dict]:
-        """Busca em todos os sites configurados (apenas sites ativos)"""
-        all_results = []
-        local_sites = []
-        national_sites = []
-        
-        # Separa sites locais dos nacionais (apenas ativos)
-        for site_name, site_config in self.sites.items():
-            if not site_config.get('active', True):  # Pula sites desabilitados
-                logging.info(f"⏭️ Pulando {site_name} (desabilitado)")
-                continue
-                
-            if site_name in ['vivareal', 'zapimoveis', 'olx']:
-                national_sites.append((site_name, site_config))
-            else:
-                local_sites.append((site_name, site_config))
-        
-        # Busca nos portais nacionais primeiro (mais confiáveis)
-        logging.info("🌐 Iniciando busca nos PORTAIS NACIONAIS...")
-        for site_name, site_config in national_sites:
-            site_results = self.scrape_site(site_name, site_config)
-            all_results.extend(site_results)
-            # Pausa entre sites nacionais
-            time.sleep(3)
-        
-        logging.info(f"📊 Encontrados {len(all_results)} imóveis nos portais nacionais")
-        
-        # Depois tenta as imobiliárias locais (se houver sites ativos)
-        if local_sites:
-            logging.info("🏢 Tentando IMOBILIÁRIAS LOCAIS...")
-            for site_name, site_config in local_sites:
-                site_results = self.scrape_site(site_name, site_config)
-                all_results.extend(site_results)
-                # Pausa mais longa para sites locais (mais sensíveis)
-                time.sleep(5)
-        else:
-            logging.info("ℹ️ Todas as imobiliárias locais estão desabilitadas no momento")
-        
-        return all_results#!/usr/bin/env python3
+#!/usr/bin/env python3
 """
 Buscador de Casas - São João del Rei
 Programa para buscar imóveis no centro e bairro Segredo
 Preço máximo: R$ 350.000
 """
 
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
 import time
+import csv
 import json
+import os
 import re
-from urllib.parse import urljoin, urlparse
-from typing import List, Dict, Optional
+import hashlib
+import html
+import io
+import math
+import random
+import sqlite3
+import unicodedata
+import zlib
+import copy
+import itertools
+import importlib
+import importlib.util
+import threading
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlparse, parse_qsl, urlencode
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from operator import attrgetter
+from typing import TYPE_CHECKING, Callable, Iterable, List, Dict, Optional, Iterator
 import logging
 
-# Configuração de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('house_finder.log'),
-        logging.StreamHandler()
-    ]
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+
+class LazyModule:
+    """Adia o import de um módulo pesado até o primeiro acesso a um atributo
+    
+    Mantém --help e --list-sites rápidos: requests, bs4, soupsieve e numpy só são
+    carregados nos caminhos que realmente buscam ou processam páginas.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+requests = LazyModule('requests')
+bs4 = LazyModule('bs4')
+sv = LazyModule('soupsieve')
+np = LazyModule('numpy')
+
+# Parser HTML: lxml é bem mais rápido que o html.parser embutido (verificado sem importá-lo)
+DEFAULT_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+
+def setup_logging(log_file: Optional[str] = 'house_finder.log'):
+    """Configura o logging (console e, opcionalmente, arquivo); chamado pelo main()"""
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+class HostRateLimiter:
+    """Token bucket adaptativo por host
+    
+    Desacelera (e bloqueia o host por um tempo com backoff exponencial + jitter)
+    em respostas 429/403/5xx e falhas de conexão, respeitando Retry-After, e
+    volta a acelerar aos poucos enquanto o host responde bem, nunca abaixo do
+    intervalo configurado para o site.
+    """
+
+    def __init__(self, default_delay: float = 2.0, min_delay: float = 0.5, max_delay: float = 60.0,
+                 burst: int = 1, base_backoff: float = 2.0):
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.burst = burst
+        self.base_backoff = base_backoff
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _state(self, url: str, delay: Optional[float] = None) -> Dict:
+        host = urlparse(url).netloc
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                interval = self.default_delay if delay is None else delay
+                state = self._hosts[host] = {
+                    'lock': threading.Lock(),
+                    'interval': interval,
+                    # on_success só desfaz as desacelerações de on_failure: nunca passa do configurado
+                    'min_interval': interval,
+                    'tokens': float(self.burst),
+                    'updated': time.monotonic(),
+                    'blocked_until': 0.0,
+                    'failures': 0
+                }
+        return state
+
+    def acquire(self, url: str, delay: Optional[float] = None):
+        """Bloqueia até que o host da URL possa receber uma nova requisição"""
+        state = self._state(url, delay)
+        
+        # Cada host tem sua própria fila; hosts diferentes não esperam uns pelos outros
+        with state['lock']:
+            while True:
+                now = time.monotonic()
+                refill_interval = max(state['interval'], 1e-6)
+                state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) / refill_interval)
+                state['updated'] = now
+                
+                wait_time = state['blocked_until'] - now
+                if wait_time <= 0:
+                    if state['tokens'] >= 1:
+                        state['tokens'] -= 1
+                        return
+                    wait_time = (1 - state['tokens']) * refill_interval
+                time.sleep(wait_time)
+
+    def on_success(self, url: str):
+        """Host respondeu bem: reduz aos poucos o intervalo, até voltar ao configurado"""
+        state = self._state(url)
+        with self._lock:
+            state['failures'] = 0
+            state['interval'] = max(state['min_interval'], state['interval'] * 0.9)
+
+    def on_failure(self, url: str, retry_after: Optional[float] = None) -> float:
+        """Host recusou ou falhou: dobra o intervalo e pausa o host; retorna a pausa em segundos"""
+        state = self._state(url)
+        with self._lock:
+            state['failures'] += 1
+            state['interval'] = min(self.max_delay, max(state['interval'], self.min_delay) * 2)
+            if retry_after is not None:
+                backoff = min(self.max_delay, retry_after)
+            else:
+                backoff = min(self.max_delay, self.base_backoff * 2 ** (state['failures'] - 1))
+                backoff *= random.uniform(0.5, 1.5)
+            state['blocked_until'] = max(state['blocked_until'], time.monotonic() + backoff)
+        return backoff
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converte o header Retry-After (segundos ou data HTTP) em segundos"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime  # raro; fora do caminho de inicialização
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+# Seletores genéricos usados quando os seletores do site não encontram o campo
+FALLBACK_SELECTORS = {
+    'title': 'h1, h2, h3, h4, .title, .titulo, .nome, [title]',
+    'price': '.valor, .price, .preco, [class*="price"], [class*="preco"], [class*="valor"]',
+    'address': '.local, .localizacao, .endereco, .address, [class*="endereco"], [class*="address"], [class*="local"]'
+}
+
+# Padrões comuns de cards quando o seletor 'property' do site não encontra nada
+FALLBACK_PROPERTY_SELECTORS = [
+    '.property', '.imovel', '.listing', '.card',
+    '[class*="property"]', '[class*="imovel"]', 
+    '[class*="listing"]', '[class*="card"]',
+    '.result-card', '.search-result'
+]
+
+
+@lru_cache(maxsize=1)
+def fallback_property_plan() -> List[tuple]:
+    """Seletores de fallback compilados (no primeiro uso)"""
+    return [(sel, sv.compile(sel)) for sel in FALLBACK_PROPERTY_SELECTORS]
+
+
+# Descoberta de cards: um card de imóvel mostra um preço em reais
+CARD_PRICE_RE = re.compile(r'R\$\s*\d')
+CSS_IDENT_RE = re.compile(r'-?[_a-zA-Z][\w-]*')
+
+
+@lru_cache(maxsize=64)
+def compiled_selector(selector: str):
+    return sv.compile(selector)
+
+
+def card_classes(tag) -> set:
+    """Classes do elemento que podem entrar num seletor CSS"""
+    return {c for c in tag.get('class') or () if CSS_IDENT_RE.fullmatch(c)}
+
+
+def card_signature(tag, classes: Optional[set] = None) -> str:
+    """Seletor que descreve o elemento: tag + classes ('div.card.destaque')"""
+    classes = card_classes(tag) if classes is None else classes
+    return tag.name + ''.join(f'.{c}' for c in sorted(classes))
+
+
+def priced_cards(cards: List, sample: Optional[int] = None) -> List:
+    """Cards (ou entre os primeiros sample) que têm um preço no texto"""
+    return [card for card in cards[:sample] if CARD_PRICE_RE.search(card.get_text(' '))]
+
+
+def discover_card_selector(soup, min_cards: int = 3, min_priced: float = 0.6) -> Optional[tuple]:
+    """Acha o container dos anúncios pela estrutura da página, sem depender de nomes de classe
+    
+    Percorre o DOM uma vez agrupando os filhos pela tag e pela assinatura do pai
+    (cards divididos em várias linhas iguais caem no mesmo grupo); o grupo com
+    mais membros exibindo um preço vence. O seletor usa as classes comuns a
+    esses membros (modificadores como 'destaque' ficam de fora).
+    Retorna (seletor, cards) ou None.
+    """
+    tag_type = bs4.Tag
+    groups = {}
+    for parent in soup.find_all(True):
+        parent_signature = None
+        for child in parent.children:
+            if isinstance(child, tag_type):
+                if parent_signature is None:
+                    parent_signature = card_signature(parent)
+                groups.setdefault((parent_signature, child.name), []).append(child)
+    
+    best = None
+    # Do maior grupo para o menor: o tamanho limita a pontuação, então dá para parar cedo
+    for members in sorted(groups.values(), key=len, reverse=True):
+        if len(members) < min_cards or (best and len(members) <= len(best)):
+            break
+        priced = priced_cards(members)
+        if len(priced) >= min_cards and len(priced) >= min_priced * len(members) \
+                and (best is None or len(priced) > len(best)):
+            best = priced
+    if best is None:
+        return None
+    
+    signature = card_signature(best[0], set.intersection(*(card_classes(card) for card in best)))
+    if '.' not in signature:
+        # Cards sem classe em comum: ancorados no container (classes ou id dele)
+        parent = best[0].parent
+        parent_id = parent.get('id')
+        if card_classes(parent):
+            signature = f'{card_signature(parent)} > {signature}'
+        elif parent_id and CSS_IDENT_RE.fullmatch(parent_id) and all(card.parent is parent for card in best):
+            signature = f'#{parent_id} > {signature}'
+        else:
+            return None
+    cards = compiled_selector(signature).select(soup)
+    if len(cards) < min_cards or len(priced_cards(cards)) < min_priced * len(cards):
+        return None
+    return signature, cards
+
+
+# Scripts com o estado da página (Next.js __NEXT_DATA__, JSON-LD, etc.)
+EMBEDDED_JSON_RE = re.compile(
+    rb'<script\b[^>]*type=["\']application/(?:ld\+)?json["\'][^>]*>(.*?)</script>',
+    re.S | re.I
 )
 
+
+def _json_scalar(value):
+    """Primeiro valor de listas (ex.: usableAreas: [90]) ou 'value' de objetos QuantitativeValue"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('value')
+    return value
+
+
+def _json_number(value) -> Optional[float]:
+    value = _json_scalar(value)
+    if value is None or value == '' or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _json_price(node: Dict):
+    """Preço de venda do objeto: número quando possível, texto bruto caso contrário"""
+    candidates = []
+    for info in node.get('pricingInfos') or []:
+        if isinstance(info, dict) and info.get('businessType', 'SALE') == 'SALE':
+            candidates.append(info.get('price'))
+    offers = node.get('offers')
+    if isinstance(offers, list):
+        offers = offers[0] if offers else None
+    if isinstance(offers, dict):
+        candidates.append(offers.get('price'))
+    candidates.extend(node.get(key) for key in ('price', 'priceValue', 'salePrice'))
+    
+    for value in candidates:
+        if value is None or value == '' or isinstance(value, (bool, dict, list)):
+            continue
+        number = _json_number(value)
+        return number if number is not None else str(value)
+    return None
+
+
+def _json_address(node: Dict) -> str:
+    address = node.get('address') or node.get('location') or node.get('locationDetails')
+    if isinstance(address, str):
+        return address
+    if not isinstance(address, dict):
+        return ''
+    keys = ('street', 'streetAddress', 'streetNumber', 'neighborhood', 'neighbourhood', 'district',
+            'city', 'municipality', 'addressLocality', 'state', 'addressRegion')
+    return ', '.join(str(address[key]) for key in keys if isinstance(address.get(key), (str, int)) and address[key])
+
+
+def _json_listing(node: Dict) -> Optional[Dict]:
+    """Converte um objeto JSON em registro de imóvel, se ele tiver cara de anúncio"""
+    link = node.get('link') if isinstance(node.get('link'), dict) else {}
+    wrapper_url = None
+    if isinstance(node.get('listing'), dict):
+        # Formato Grupo ZAP: {"listing": {...}, "link": {"href": ...}}
+        wrapper_url = node.get('url') or link.get('href')
+        node = node['listing']
+        link = node.get('link') if isinstance(node.get('link'), dict) else {}
+    
+    title = next((node[key] for key in ('title', 'name', 'subject', 'headline')
+                  if isinstance(node.get(key), str) and node[key].strip()), None)
+    price = _json_price(node)
+    if not title or price is None:
+        return None
+    
+    url = wrapper_url or node.get('url') or link.get('href') or node.get('friendlyUrl') or ''
+    bedrooms = _json_number(node.get('bedrooms') or node.get('numberOfBedrooms') or node.get('numberOfRooms') or node.get('rooms'))
+    return {
+        'title': title.strip(),
+        'price': price,
+        'address': _json_address(node),
+        'url': url if isinstance(url, str) else '',
+        'area': _json_number(node.get('usableAreas') or node.get('floorSize') or node.get('area') or node.get('size')),
+        'bedrooms': int(bedrooms) if bedrooms is not None else None
+    }
+
+
+def iter_embedded_listings(content: bytes) -> Iterator[Dict]:
+    """Percorre os JSONs embutidos na página e gera os anúncios encontrados, sem montar o DOM"""
+    seen = set()
+    for match in EMBEDDED_JSON_RE.finditer(content):
+        try:
+            data = json.loads(match.group(1))
+        except ValueError:
+            continue
+        
+        # Percurso iterativo em ordem de documento (estados Next.js podem ser bem profundos)
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                record = _json_listing(node)
+                if record:
+                    key = record['url'] or record['title']
+                    if key not in seen:
+                        seen.add(key)
+                        yield record
+                    continue
+                stack.extend(reversed(list(node.values())))
+            elif isinstance(node, list):
+                stack.extend(reversed(node))
+
+
+def compile_matcher(selector: str):
+    """Função que testa se um elemento casa com o seletor
+    
+    Seletores simples ('.classe', 'tag', '[attr]', '[attr="v"]', '[class*="v"]')
+    viram comparações diretas em Python, bem mais baratas que soupsieve.match;
+    os demais usam o seletor compilado pelo soupsieve.
+    """
+    class_match = re.fullmatch(r'\.([\w-]+)', selector)
+    if class_match:
+        name = class_match.group(1)
+        return lambda element: name in element.get('class', ())
+    if re.fullmatch(r'[a-z][a-z0-9]*', selector):
+        return lambda element: element.name == selector
+    attr_match = re.fullmatch(r'\[([\w-]+)(?:(\*?=)"([^"]*)")?\]', selector)
+    if attr_match:
+        attr, operator, value = attr_match.groups()
+        if operator is None:
+            return lambda element: element.has_attr(attr)
+        
+        def attr_matches(element):
+            attr_value = element.get(attr)
+            if isinstance(attr_value, list):
+                attr_value = ' '.join(attr_value)
+            if operator == '=':
+                return attr_value == value
+            return bool(attr_value) and value in attr_value
+        return attr_matches
+    return sv.compile(selector).match
+
+
+class SelectorPlan:
+    """Seletores de um site compilados uma única vez, com os mais bem-sucedidos testados primeiro"""
+
+    FIELDS = ('title', 'price', 'address', 'link')
+
+    def __init__(self, selectors: Dict):
+        self.property = [(sel.strip(), sv.compile(sel.strip())) for sel in selectors['property'].split(', ')]
+        self.fields = {}
+        self.hits = {}
+        for field in self.FIELDS:
+            patterns = [sel.strip() for sel in selectors.get(field, '').split(', ') if sel.strip()]
+            # Fallbacks genéricos entram no fim da lista, com prioridade menor
+            for sel in FALLBACK_SELECTORS.get(field, '').split(', '):
+                if sel and sel not in patterns:
+                    patterns.append(sel)
+            self.fields[field] = [(sel, compile_matcher(sel)) for sel in patterns]
+            self.hits[field] = {sel: 0 for sel in patterns}
+
+    def extract(self, card) -> Dict[str, str]:
+        """Extrai todos os campos do card percorrendo seus elementos uma única vez"""
+        # Cópia local: outra thread pode reordenar as listas enquanto este card é processado
+        candidates = dict(self.fields)
+        best = {field: (len(candidates[field]), '') for field in self.FIELDS}
+        pending = set(self.FIELDS)
+        tag_type = bs4.Tag
+        
+        for element in card.descendants:
+            if not isinstance(element, tag_type):
+                continue
+            for field in list(pending):
+                field_candidates = candidates[field]
+                # Só testa seletores de prioridade maior que a do melhor encontrado até agora
+                for rank in range(best[field][0]):
+                    if not field_candidates[rank][1](element):
+                        continue
+                    value = element.get('href') if field == 'link' else element.get_text(strip=True)
+                    if value:
+                        best[field] = (rank, value)
+                        if rank == 0:
+                            pending.discard(field)
+                        break
+            if not pending:
+                break
+        
+        for field, (rank, value) in best.items():
+            if value:
+                self.record_hit(field, candidates[field][rank][0])
+        return {field: value for field, (rank, value) in best.items()}
+
+    def record_hit(self, field: str, selector: str):
+        """Conta o acerto e promove o seletor vencedor para o início da lista"""
+        hits = self.hits[field]
+        hits[selector] += 1
+        field_candidates = self.fields[field]
+        if field_candidates[0][0] != selector:
+            self.fields[field] = sorted(field_candidates, key=lambda item: -hits[item[0]])
+
+    def find_cards(self, soup) -> tuple:
+        """Retorna (seletor, cards) do primeiro seletor de cards que encontrar algo"""
+        for selector, compiled in self.property:
+            props = compiled.select(soup)
+            if props:
+                return selector, props
+        return None, []
+
+class CachedPage:
+    """Resposta HTTP servida a partir do cache em disco"""
+
+    def __init__(self, url: str, content: bytes, meta: Dict):
+        self.url = meta.get('final_url', url)
+        self.content = content
+        self.meta = meta
+        self.status_code = 200
+        # Conteúdo idêntico ao da última busca (TTL válido ou 304 Not Modified)
+        self.not_modified = True
+
+
+def accept_encoding() -> str:
+    """Compressões anunciadas no Accept-Encoding: só as que o urllib3 consegue decodificar
+    
+    gzip/deflate sempre; br com o pacote brotli (ou brotlicffi) e zstd com o zstandard.
+    """
+    return requests.utils.DEFAULT_ACCEPT_ENCODING
+
+
+class Http2Response:
+    """Resposta do httpx com os atributos de requests.Response usados pelo scraper"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.elapsed = response.elapsed
+        self.http_version = response.http_version
+
+    @property
+    def content(self) -> bytes:
+        return self._response.content
+
+    @property
+    def text(self) -> str:
+        return self._response.text
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f'{self.status_code} para {self.url}', response=self)
+
+
+class Http2Session:
+    """Sessão HTTP/2 (httpx) com a interface de requests.Session usada pelo scraper
+    
+    Requisições ao mesmo host são multiplexadas numa conexão TLS só; erros do
+    httpx viram as exceções do requests que o scraper já trata.
+    """
+
+    def __init__(self, max_connections: int = 20):
+        import httpx
+        self._httpx = httpx
+        self.headers = {}
+        self.client = httpx.Client(http2=True, limits=httpx.Limits(max_connections=max_connections))
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def get(self, url: str, headers: Optional[Dict] = None, timeout: float = None, allow_redirects: bool = True):
+        try:
+            response = self.client.get(url, headers={**self.headers, **(headers or {})},
+                                       timeout=timeout, follow_redirects=allow_redirects)
+        except self._httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except self._httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+        
+        with self._lock:
+            host = self._stats.setdefault(response.url.host, {'requests': 0, 'connections': 0, 'streams': set()})
+            host['requests'] += 1
+            # Cada conexão HTTP/2 é identificada pelo stream de rede exposto pelo httpcore
+            stream = response.extensions.get('network_stream')
+            if stream is not None and id(stream) not in host['streams']:
+                host['streams'].add(id(stream))
+                host['connections'] += 1
+        return Http2Response(response)
+
+    def connection_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {host: {'requests': stats['requests'], 'connections': stats['connections']}
+                    for host, stats in self._stats.items()}
+
+    def close(self):
+        self.client.close()
+
+
+class FetchMemo:
+    """Compartilha downloads idênticos entre as consultas do modo lote
+    
+    A primeira consulta que pede uma URL faz o download; as outras (inclusive
+    as que pedem ao mesmo tempo) esperam e recebem a mesma resposta ou erro.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.hits = 0
+
+    def fetch(self, url: str, loader):
+        with self._lock:
+            future = self._futures.get(url)
+            owner = future is None
+            if owner:
+                future = self._futures[url] = Future()
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                future.set_result(loader())
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+
+class ResponseCache:
+    """Cache persistente de respostas HTTP com TTL, revalidação condicional e limite de tamanho"""
+
+    def __init__(self, directory: str = '.house_finder_cache/http', ttl: float = 300,
+                 max_bytes: int = 50 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _paths(self, url: str):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{key}.json'), os.path.join(self.directory, f'{key}.body')
+
+    def _write(self, path: str, data: bytes):
+        # Escrita atômica para não deixar entradas corrompidas se o processo cair
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Retorna os metadados da entrada em cache, ou None"""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if os.path.exists(body_path) else None
+
+    def is_fresh(self, meta: Dict) -> bool:
+        """Entrada validada há menos de TTL segundos dispensa acesso à rede"""
+        return time.time() - meta.get('validated_at', 0) < self.ttl
+
+    def conditional_headers(self, meta: Dict) -> Dict:
+        """Headers If-None-Match / If-Modified-Since para revalidar a entrada"""
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def load(self, url: str, meta: Dict) -> Optional[CachedPage]:
+        """Carrega o corpo da entrada como CachedPage"""
+        _, body_path = self._paths(url)
+        try:
+            with open(body_path, 'rb') as f:
+                return CachedPage(url, f.read(), meta)
+        except OSError:
+            return None
+
+    def put(self, url: str, response) -> Dict:
+        """Armazena uma resposta 200 e aplica o limite de tamanho"""
+        meta_path, body_path = self._paths(url)
+        meta = {
+            'url': url,
+            'final_url': response.url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'validated_at': time.time(),
+            'size': len(response.content)
+        }
+        with self._lock:
+            self._write(body_path, response.content)
+            self._write(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+            self._evict()
+        return meta
+
+    def touch(self, url: str, meta: Dict):
+        """Marca a entrada como revalidada (após um 304)"""
+        meta['validated_at'] = time.time()
+        self.update(url, meta)
+
+    def store_parsed(self, url: str, fingerprint: str, data: Dict):
+        """Guarda o resultado do parse junto da entrada, para pular o parse em respostas 304"""
+        meta = self.get(url)
+        if meta is None:
+            return
+        meta['parsed'] = {'fingerprint': fingerprint, 'data': data}
+        self.update(url, meta)
+
+    def update(self, url: str, meta: Dict):
+        meta_path, _ = self._paths(url)
+        with self._lock:
+            self._write(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    def _evict(self):
+        """Remove as entradas usadas há mais tempo até caber em max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.body'):
+                continue
+            body_path = os.path.join(self.directory, name)
+            meta_path = body_path[:-len('.body')] + '.json'
+            try:
+                size = os.path.getsize(body_path) + os.path.getsize(meta_path)
+                last_used = os.path.getmtime(meta_path)
+            except OSError:
+                continue
+            entries.append((last_used, size, body_path, meta_path))
+            total += size
+        
+        for last_used, size, body_path, meta_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (body_path, meta_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+
+def normalize_url(url: str) -> str:
+    """Normaliza a URL do anúncio para usar como chave (sem fragmento, barra final e parâmetros de rastreamento)"""
+    parsed = urlparse(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parsed.query) if not k.lower().startswith('utm_'))
+    path = parsed.path.rstrip('/') or '/'
+    return parsed._replace(
+        scheme=parsed.scheme.lower(),
+        netloc=parsed.netloc.lower(),
+        path=path,
+        query=urlencode(query),
+        fragment=''
+    ).geturl()
+
+
+NON_WORD_RE = re.compile(r'[^\w]+')
+
+
+def fold_text(text: str) -> str:
+    """Minúsculas sem acentos nem pontuação ('São João' -> 'sao joao')"""
+    # NFKD separa letra e acento; o encode para ASCII descarta os acentos de uma vez
+    text = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode('ascii')
+    return NON_WORD_RE.sub(' ', text).strip()
+
+
+# Primeiro valor de um texto de preço: milhares com '.', centavos com ',' e multiplicador opcional ('350 mil')
+PRICE_PATTERN = r'(\d{1,3}(?:[.,]\d{3})+|\d+)(?:,(\d{1,2}))?(?!\d)\s*(milh[õo]es|milh[ãa]o|mil\b)?'
+PRICE_RE = re.compile(PRICE_PATTERN, re.IGNORECASE)
+# Versão em lote: um '\x00' antes de cada texto, um match (com ou sem preço) por texto
+PRICE_COLUMN_RE = re.compile(r'\x00[^\d\x00]*(?:' + PRICE_PATTERN + ')?', re.IGNORECASE)
+
+
+def parse_price(text: str) -> Optional[float]:
+    """Converte um preço no formato brasileiro em float
+    
+    'R$ 1.234.567,89', '350 mil', '1,2 milhão'; em faixas ('R$ 200.000 a R$ 250.000')
+    vale o primeiro valor. Sem número ('Sob consulta') retorna None.
+    """
+    match = PRICE_RE.search(text or '')
+    if match is None:
+        return None
+    integer, decimals, multiplier = match.groups()
+    price = float(f"{integer.replace('.', '').replace(',', '')}.{decimals or ''}")
+    if multiplier:
+        price *= 1e6 if multiplier.lower().startswith('milh') else 1e3
+    return price
+
+
+def normalize_prices(values: List) -> 'np.ndarray':
+    """Versão em lote de parse_price: textos (ou números já convertidos) viram um array float, NaN sem preço
+    
+    Os textos são unidos e lidos por uma única chamada de regex (findall), em vez de
+    uma busca por card; a conversão numérica é feita pelo NumPy.
+    """
+    texts = ['' if value is None or isinstance(value, (int, float)) else str(value).replace('\x00', '')
+             for value in values]
+    parts = PRICE_COLUMN_RE.findall('\x00' + '\x00'.join(texts))
+    prices = np.array([f"{integer.replace('.', '').replace(',', '')}.{decimals}" if integer else 'nan'
+                       for integer, decimals, _ in parts], dtype=float)
+    if any(multiplier for _, _, multiplier in parts):
+        prices *= np.array([1e6 if multiplier.lower().startswith('milh') else 1e3 if multiplier else 1.0
+                            for _, _, multiplier in parts])
+    for position, value in enumerate(values):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            prices[position] = value
+    return prices
+
+
+# Bairros de São João del Rei e as grafias com que aparecem nos anúncios
+SJDR_NEIGHBORHOODS = {
+    'centro': ['centro', 'centro historico', 'centro historico de sao joao del rei'],
+    'segredo': ['segredo', 'bairro segredo', 'bairro do segredo'],
+    'fabricas': ['fabricas', 'bairro das fabricas'],
+    'matozinhos': ['matozinhos', 'matosinhos'],
+    'colonia do marcal': ['colonia do marcal', 'marcal'],
+    'tijuco': ['tijuco'],
+    'bonfim': ['bonfim', 'senhor do bonfim'],
+    'senhor dos montes': ['senhor dos montes'],
+    'guarda mor': ['guarda mor'],
+    'sao geraldo': ['sao geraldo'],
+    'dom bosco': ['dom bosco'],
+    'bela vista': ['bela vista'],
+    'vila santa terezinha': ['vila santa terezinha', 'santa terezinha', 'santa teresinha'],
+    'sao dimas': ['sao dimas'],
+    'pio xii': ['pio xii', 'pio 12'],
+    'jardim central': ['jardim central'],
+    'caieiras': ['caieiras'],
+}
+
+
+class NeighborhoodIndex:
+    """Localiza os bairros alvo num endereço com uma única regex sobre o texto sem acentos
+    
+    Cada alvo é expandido com as grafias do gazetteer (nome canônico ou qualquer
+    alias serve); nomes fora do gazetteer valem como estão. Os limites de palavra
+    evitam falsos positivos como 'centro' dentro de 'Concentro'.
+    """
+
+    def __init__(self, targets: List[str], gazetteer: Dict[str, List[str]] = SJDR_NEIGHBORHOODS):
+        canonical_of = {}
+        for canonical, aliases in gazetteer.items():
+            for alias in [canonical] + aliases:
+                canonical_of[fold_text(alias)] = canonical
+        
+        self.aliases = {}
+        for target in targets:
+            folded = fold_text(target)
+            canonical = canonical_of.get(folded)
+            if canonical is None:
+                self.aliases[folded] = folded
+                continue
+            for alias in [canonical] + gazetteer[canonical]:
+                self.aliases[fold_text(alias)] = canonical
+        
+        # Grafias mais longas primeiro: 'bairro do segredo' ganha de 'segredo'
+        alternatives = '|'.join(re.escape(alias) for alias in sorted(self.aliases, key=len, reverse=True) if alias)
+        self.pattern = re.compile(rf'\b(?:{alternatives})\b') if alternatives else None
+
+    def find(self, address: str) -> Optional[str]:
+        """Nome canônico do primeiro bairro alvo encontrado no endereço"""
+        if self.pattern is None or not address:
+            return None
+        match = self.pattern.search(fold_text(address))
+        return self.aliases[match.group(0)] if match else None
+
+    def mask(self, addresses: List[str]) -> 'np.ndarray':
+        """find() para uma lista de endereços: uma busca por endereço, qualquer que seja o número de alvos"""
+        if self.pattern is None:
+            return np.zeros(len(addresses), dtype=bool)
+        search = self.pattern.search
+        return np.fromiter((search(fold_text(address or '')) is not None for address in addresses),
+                           dtype=bool, count=len(addresses))
+
+
+@lru_cache(maxsize=None)
+def neighborhood_index(targets: tuple) -> NeighborhoodIndex:
+    """Índice compilado uma vez para cada conjunto de bairros alvo"""
+    return NeighborhoodIndex(list(targets))
+
+
+def slugify(text: str) -> str:
+    """Slug usado nas URLs dos portais ('São João del Rei' -> 'sao-joao-del-rei')"""
+    return fold_text(text).replace(' ', '-')
+
+
+# Nome do estado como aparece nas URLs dos portais (ex.: vivareal)
+STATE_SLUGS = {
+    'ac': 'acre', 'al': 'alagoas', 'ap': 'amapa', 'am': 'amazonas', 'ba': 'bahia', 'ce': 'ceara',
+    'df': 'distrito-federal', 'es': 'espirito-santo', 'go': 'goias', 'ma': 'maranhao',
+    'mt': 'mato-grosso', 'ms': 'mato-grosso-do-sul', 'mg': 'minas-gerais', 'pa': 'para',
+    'pb': 'paraiba', 'pr': 'parana', 'pe': 'pernambuco', 'pi': 'piaui', 'rj': 'rio-de-janeiro',
+    'rn': 'rio-grande-do-norte', 'rs': 'rio-grande-do-sul', 'ro': 'rondonia', 'rr': 'roraima',
+    'sc': 'santa-catarina', 'sp': 'sao-paulo', 'se': 'sergipe', 'to': 'tocantins'
+}
+
+
+BRL_SEPARATORS = str.maketrans(',.', '.,')
+
+
+def format_brl(value: float) -> str:
+    """Valor em reais com separadores brasileiros (1234.5 -> 'R$ 1.234,50')"""
+    return f"R$ {value:,.2f}".translate(BRL_SEPARATORS)
+
+
+# Título dado a cards sem título: depende da posição do card na busca
+PLACEHOLDER_TITLE_RE = re.compile(r'Casa \d+ - ')
+
+
+def placeholder_title(number: int, site_label: str) -> str:
+    return f'Casa {number} - {site_label}'
+
+
+def is_placeholder_title(title: str, site_label: str) -> bool:
+    return bool(PLACEHOLDER_TITLE_RE.match(title)) and title.endswith(f' - {site_label}')
+
+
+class Listing:
+    """Imóvel aceito na busca
+    
+    Registro compacto (__slots__, sem um dict por anúncio) que continua aceitando
+    o acesso por chave do formato antigo (listing['price'], .get, 'url' in listing),
+    então deduplicação, histórico e CSV não mudam. price_formatted só é montado
+    quando lido; columns() entrega os campos em colunas para pandas/pyarrow.
+    """
+
+    FIELDS = ('site', 'title', 'price', 'price_formatted', 'address', 'url', 'is_local', 'area', 'bedrooms')
+    # Só aparecem nas chaves (JSON/CSV) quando preenchidos
+    OPTIONAL = ('pending_location', 'status', 'previous_price')
+    __slots__ = ('site', 'title', 'price', 'address', 'url', 'is_local', 'area', 'bedrooms',
+                 'pending_location', 'status', 'previous_price')
+    _KEYS = frozenset(FIELDS + OPTIONAL)
+
+    def __init__(self, site: str, title: str, price: float, address: str, url: str, is_local: bool = False,
+                 area: Optional[float] = None, bedrooms: Optional[int] = None, pending_location: bool = False,
+                 status: Optional[str] = None, previous_price: Optional[float] = None):
+        self.site = site
+        self.title = title
+        self.price = price
+        self.address = address
+        self.url = url
+        self.is_local = is_local
+        self.area = area
+        self.bedrooms = bedrooms
+        self.pending_location = pending_location
+        self.status = status
+        self.previous_price = previous_price
+
+    @property
+    def price_formatted(self) -> str:
+        return format_brl(self.price)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Listing':
+        """Recria o registro a partir de to_dict() (cache de parse, arquivos salvos)"""
+        return cls(**{key: value for key, value in data.items() if key in cls.__slots__})
+
+    def to_dict(self) -> Dict:
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def copy(self, **changes) -> 'Listing':
+        listing = copy.copy(self)
+        for key, value in changes.items():
+            listing[key] = value
+        return listing
+
+    @staticmethod
+    def columns(listings: List['Listing'], fields: tuple = FIELDS) -> Dict[str, list]:
+        """Campos em colunas: pandas.DataFrame(Listing.columns(...)) ou pyarrow.table(...)"""
+        return {field: [getattr(listing, field) for listing in listings] for field in fields}
+
+    def keys(self) -> List[str]:
+        keys = list(self.FIELDS)
+        if self.pending_location:
+            keys.append('pending_location')
+        if self.status is not None:
+            keys += ['status', 'previous_price']
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, key) -> bool:
+        return key in self.keys()
+
+    def __getitem__(self, key: str):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self._KEYS else default
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Listing):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Listing({self.site!r}, {self.title!r}, {self.price_formatted!r})"
+
+
+class ListingDeduplicator:
+    """Remove anúncios repetidos entre portais (mesma casa com títulos ligeiramente diferentes)
+    
+    Em vez de comparar todos os pares, cada anúncio é indexado por faixa de preço
+    + endereço normalizado e por faixa de preço + bandas de MinHash do título +
+    endereço; só pares que caem no mesmo bloco são comparados, com similaridade
+    de trigramas. Com 32 bandas de 2 linhas o limiar do LSH (~0,18) fica bem
+    abaixo do corte de similaridade, então pares acima do corte quase nunca
+    deixam de ser comparados.
+    
+    Anúncios do mesmo portal com URLs diferentes nunca são fundidos (os títulos
+    são gerados por template e casas vizinhas parecem iguais), e anúncios sem
+    preço só são removidos por URL repetida.
+    """
+
+    # Partes do endereço que todos os anúncios compartilham e não distinguem imóveis
+    ADDRESS_NOISE_RE = re.compile(r'\b(?:sao joao del rei|sao joao del rey|sjdr|mg|minas gerais|brasil)\b')
+
+    def __init__(self, similarity: float = 0.55, price_tolerance: float = 0.03,
+                 num_perm: int = 64, bands: int = 32):
+        self.similarity = similarity
+        self.price_tolerance = price_tolerance
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.num_perm = num_perm
+        self._coefficients = None
+
+    def coefficients(self):
+        """Coeficientes fixos do hash (as assinaturas ficam estáveis entre execuções), criados no primeiro uso"""
+        if self._coefficients is None:
+            a = np.array([zlib.crc32(f'a{i}'.encode()) | 1 for i in range(self.num_perm)], dtype=np.uint64)[:, None]
+            b = np.array([zlib.crc32(f'b{i}'.encode()) for i in range(self.num_perm)], dtype=np.uint64)[:, None]
+            self._coefficients = (a, b)
+        return self._coefficients
+
+    def shingles(self, listing: Dict) -> set:
+        """Trigramas de caracteres do título + endereço normalizados"""
+        text = fold_text(f"{listing.get('title', '')} {listing.get('address', '')}")
+        return {text[i:i + 3] for i in range(max(len(text) - 2, 1))}
+
+    def signature(self, shingles: set) -> List[int]:
+        """Assinatura MinHash: todas as permutações calculadas de uma vez com NumPy"""
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        # a, h < 2^32: o produto cabe em uint64; a máscara mantém hashes de 32 bits
+        a, b = self.coefficients()
+        return ((a * hashes + b) & 0xFFFFFFFF).min(axis=1).tolist()
+
+    def price_bucket(self, price: float) -> int:
+        # Faixas logarítmicas: vizinhas cobrem a tolerância de preço em qualquer patamar
+        return int(math.log(max(price, 1)) / math.log(1 + self.price_tolerance))
+
+    def address_key(self, address: str) -> str:
+        """Endereço sem acentos, pontuação, cidade e estado ('' quando só sobra a cidade)"""
+        return ' '.join(self.ADDRESS_NOISE_RE.sub(' ', fold_text(address or '')).split())
+
+    def is_duplicate(self, first: Dict, second: Dict, first_shingles: set, second_shingles: set) -> bool:
+        price_a, price_b = first.get('price'), second.get('price')
+        if not price_a or not price_b:
+            return False
+        # Mesmo portal com URLs diferentes são anúncios diferentes (títulos de template se repetem)
+        if (first.get('site') == second.get('site')
+                and normalize_url(first.get('url') or '') != normalize_url(second.get('url') or '')):
+            return False
+        if abs(price_a - price_b) > self.price_tolerance * max(price_a, price_b):
+            return False
+        union = first_shingles | second_shingles
+        return bool(union) and len(first_shingles & second_shingles) / len(union) >= self.similarity
+
+    def deduplicate(self, listings: Iterable[Listing]) -> List[Listing]:
+        """Mantém o primeiro anúncio de cada grupo de duplicatas, preservando a ordem"""
+        unique = []
+        seen_urls = set()
+        blocks = {}
+        kept_shingles = []
+        
+        for listing in listings:
+            # Duplicata exata: mesma URL normalizada (links genéricos para o site não contam)
+            url_key = normalize_url(listing['url']) if listing.get('url') else ''
+            if url_key and urlparse(url_key).path != '/':
+                if url_key in seen_urls:
+                    continue
+                seen_urls.add(url_key)
+            
+            # Sem preço não há como confirmar que é a mesma casa: só a URL decide
+            if not listing.get('price'):
+                unique.append(listing)
+                kept_shingles.append(set())
+                continue
+            
+            shingles = self.shingles(listing)
+            signature = self.signature(shingles)
+            bucket = self.price_bucket(listing['price'])
+            keys = [('band', band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                    for band in range(self.bands)]
+            address = self.address_key(listing.get('address', ''))
+            if address:
+                keys.append(('address', address))
+            
+            # Candidatos: mesmo endereço ou mesma banda de MinHash em faixas de preço vizinhas
+            candidates = set()
+            for price_key in (bucket - 1, bucket, bucket + 1):
+                for key in keys:
+                    candidates.update(blocks.get((price_key,) + key, ()))
+            
+            if any(self.is_duplicate(unique[index], listing, kept_shingles[index], shingles)
+                   for index in sorted(candidates)):
+                continue
+            
+            index = len(unique)
+            unique.append(listing)
+            kept_shingles.append(shingles)
+            for key in keys:
+                blocks.setdefault((bucket,) + key, []).append(index)
+        
+        return unique
+
+
+class ListingStore:
+    """Histórico local dos anúncios em SQLite: primeira/última aparição e histórico de preços"""
+
+    def __init__(self, path: str = 'casas_sjdr.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        """Conexão SQLite, aberta no primeiro uso (sempre acessada com self._lock)"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._create_tables()
+        return self._conn
+
+    def _create_tables(self):
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS listings (
+                url_key TEXT PRIMARY KEY,
+                url TEXT,
+                site TEXT,
+                title TEXT,
+                address TEXT,
+                price REAL,
+                is_local INTEGER,
+                area REAL,
+                bedrooms INTEGER,
+                first_seen TEXT,
+                last_seen TEXT
+            );
+            CREATE TABLE IF NOT EXISTS price_history (
+                url_key TEXT,
+                price REAL,
+                seen_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_price_history_key ON price_history (url_key);
+        """)
+
+    @staticmethod
+    def listing_key(listing: Listing) -> str:
+        """Chave do anúncio: URL normalizada, ou site + título quando o link é só a página do site
+        
+        Sem link nem título próprio (título gerado pela posição do card), a chave
+        usa endereço + preço, que não mudam quando o card muda de lugar na página.
+        """
+        url_key = normalize_url(listing['url']) if listing.get('url') else ''
+        if not url_key or urlparse(url_key).path == '/':
+            if is_placeholder_title(listing['title'], listing['site']):
+                return f"{listing['site'].lower()}|{fold_text(listing['address'])}|{listing['price']:.0f}"
+            return f"{listing['site'].lower()}|{listing['title'].lower()}"
+        return url_key
+
+    def record(self, listings: List[Listing]) -> List[Listing]:
+        """Registra os anúncios da execução e retorna os novos ou com preço alterado
+        
+        Cada item retornado é uma cópia do anúncio com 'status' ('new' ou
+        'price_changed') e 'previous_price'.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        changes = []
+        with self._lock, self.conn:
+            for listing in listings:
+                key = self.listing_key(listing)
+                row = self.conn.execute('SELECT price FROM listings WHERE url_key = ?', (key,)).fetchone()
+                
+                if row is None:
+                    self.conn.execute(
+                        'INSERT INTO listings (url_key, url, site, title, address, price, is_local, area, bedrooms, first_seen, last_seen) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (key, listing['url'], listing['site'], listing['title'], listing['address'], listing['price'],
+                         int(listing.get('is_local', False)), listing.get('area'), listing.get('bedrooms'), now, now)
+                    )
+                    self.conn.execute('INSERT INTO price_history VALUES (?, ?, ?)', (key, listing['price'], now))
+                    changes.append(listing.copy(status='new', previous_price=None))
+                    continue
+                
+                previous_price = row[0]
+                self.conn.execute(
+                    'UPDATE listings SET url = ?, title = ?, address = ?, price = ?, last_seen = ? WHERE url_key = ?',
+                    (listing['url'], listing['title'], listing['address'], listing['price'], now, key)
+                )
+                if previous_price != listing['price']:
+                    self.conn.execute('INSERT INTO price_history VALUES (?, ?, ?)', (key, listing['price'], now))
+                    changes.append(listing.copy(status='price_changed', previous_price=previous_price))
+        return changes
+
+    def price_history(self, listing: Listing) -> List[tuple]:
+        """Histórico (data, preço) de um anúncio"""
+        with self._lock:
+            return self.conn.execute(
+                'SELECT seen_at, price FROM price_history WHERE url_key = ? ORDER BY seen_at',
+                (self.listing_key(listing),)
+            ).fetchall()
+
+    def all_listings(self) -> List[Dict]:
+        """Todos os anúncios do histórico, com primeira e última aparição"""
+        with self._lock:
+            cursor = self.conn.execute(
+                'SELECT url, site, title, address, price, is_local, area, bedrooms, first_seen, last_seen FROM listings')
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+
+
+class ListingIndex:
+    """Anúncios do histórico em memória, com índices ordenados para as consultas da API local
+    
+    Índices: preço (lista ordenada, faixa por bisect), bairro e site (ids em ordem
+    de preço) e primeira aparição (ordenada). Cada consulta parte do índice que
+    devolve menos candidatos e só confere os demais filtros neles. O índice é
+    refeito quando o arquivo do histórico muda (ex.: um --watch rodando ao lado).
+    """
+
+    SORTS = {'price', '-price', 'first_seen', '-first_seen'}
+    MAX_LIMIT = 500
+
+    def __init__(self, store: ListingStore):
+        self.store = store
+        self.neighborhoods = NeighborhoodIndex(list(SJDR_NEIGHBORHOODS))
+        self._refresh_lock = threading.Lock()
+        self._mtime = None
+        self._state = None
+
+    def refresh(self) -> bool:
+        """Recarrega o histórico se ele mudou desde a última carga"""
+        try:
+            mtime = os.stat(self.store.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._state is not None and mtime == self._mtime:
+            return False
+        with self._refresh_lock:
+            if self._state is not None and mtime == self._mtime:
+                return False
+            started = time.perf_counter()
+            self._state = self.build(self.store.all_listings())
+            self._mtime = mtime
+            logging.info(f"🗂️ Índice de consulta: {len(self._state['records'])} anúncios "
+                         f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+        return True
+
+    def build(self, rows: List[Dict]) -> Dict:
+        records = []
+        for row in rows:
+            record = dict(row, is_local=bool(row['is_local']), price_formatted=format_brl(row['price'] or 0))
+            record['neighborhood'] = self.neighborhoods.find(row['address'] or '')
+            records.append(record)
+        by_price = sorted(range(len(records)), key=lambda i: records[i]['price'] or 0)
+        by_first_seen = sorted(range(len(records)), key=lambda i: records[i]['first_seen'] or '')
+        site_keys = [self.site_key(record['site']) for record in records]
+        by_neighborhood = {}
+        by_site = {}
+        for i in by_price:
+            if records[i]['neighborhood']:
+                by_neighborhood.setdefault(records[i]['neighborhood'], []).append(i)
+            by_site.setdefault(site_keys[i], []).append(i)
+        return {
+            'records': records,
+            'site_keys': site_keys,
+            'by_price': by_price,
+            'prices': [records[i]['price'] or 0 for i in by_price],
+            'by_first_seen': by_first_seen,
+            'first_seen': [records[i]['first_seen'] or '' for i in by_first_seen],
+            'by_neighborhood': by_neighborhood,
+            'by_site': by_site
+        }
+
+    def __len__(self) -> int:
+        return len(self._state['records']) if self._state else 0
+
+    @staticmethod
+    def site_key(site: str) -> str:
+        return fold_text((site or '').replace('_', ' '))
+
+    def neighborhood_key(self, neighborhood: str) -> str:
+        return self.neighborhoods.find(neighborhood) or fold_text(neighborhood)
+
+    def query(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+              neighborhood: Optional[str] = None, site: Optional[str] = None, since: Optional[str] = None,
+              sort: str = 'price', limit: int = 50, offset: int = 0) -> Dict:
+        """Anúncios que atendem a todos os filtros; since compara com a primeira aparição (ISO)"""
+        if sort not in self.SORTS:
+            raise ValueError(f"sort deve ser um de {sorted(self.SORTS)}")
+        if limit < 1 or offset < 0:
+            raise ValueError("limit deve ser >= 1 e offset >= 0")
+        limit = min(limit, self.MAX_LIMIT)
+        state = self._state
+        records = state['records']
+        
+        # Candidatos de cada índice: (tamanho, ids, ordenado por)
+        lo = bisect_left(state['prices'], min_price) if min_price is not None else 0
+        hi = bisect_right(state['prices'], max_price) if max_price is not None else len(records)
+        sources = [(max(hi - lo, 0), lambda: state['by_price'][lo:hi], 'price')]
+        if neighborhood:
+            ids = state['by_neighborhood'].get(self.neighborhood_key(neighborhood), [])
+            sources.append((len(ids), lambda: ids, 'price'))
+        if site:
+            site_ids = state['by_site'].get(self.site_key(site), [])
+            sources.append((len(site_ids), lambda: site_ids, 'price'))
+        if since:
+            start = bisect_left(state['first_seen'], since)
+            sources.append((len(records) - start, lambda: state['by_first_seen'][start:], 'first_seen'))
+        _, candidates, order = min(sources, key=lambda source: source[0])
+        
+        neighborhood_key = self.neighborhood_key(neighborhood) if neighborhood else None
+        site_key = self.site_key(site) if site else None
+        site_keys = state['site_keys']
+        matched = []
+        for i in candidates():
+            record = records[i]
+            price = record['price'] or 0
+            if ((min_price is not None and price < min_price) or (max_price is not None and price > max_price)
+                    or (neighborhood_key and record['neighborhood'] != neighborhood_key)
+                    or (site_key and site_keys[i] != site_key)
+                    or (since and (record['first_seen'] or '') < since)):
+                continue
+            matched.append(record)
+        
+        field = sort.lstrip('-')
+        if field != order:
+            matched.sort(key=lambda record: record[field] or (0 if field == 'price' else ''))
+        if sort.startswith('-'):
+            matched.reverse()
+        return {'total': len(matched), 'offset': offset, 'listings': matched[offset:offset + limit]}
+
+    def stats(self) -> Dict:
+        """Totais por site e por bairro e faixa de preços do histórico"""
+        state = self._state
+        prices = state['prices']
+        return {
+            'total': len(prices),
+            'min_price': prices[0] if prices else None,
+            'median_price': prices[len(prices) // 2] if prices else None,
+            'max_price': prices[-1] if prices else None,
+            'by_site': {state['records'][ids[0]]['site']: len(ids) for ids in state['by_site'].values()},
+            'by_neighborhood': {name: len(ids) for name, ids in sorted(state['by_neighborhood'].items())}
+        }
+
+
+# Seletores genéricos de páginas de detalhe (sobrescritos por site com 'detail_selectors')
+DETAIL_SELECTORS = {
+    'address': '[itemprop="streetAddress"], [data-testid="address-info"], .address, .endereco, .localizacao, [class*="address"], [class*="endereco"]',
+    'area': '[itemprop="floorSize"], [data-testid="area"], .area, [class*="area"]',
+    'bedrooms': '[itemprop="numberOfRooms"], [data-testid="bedrooms"], .quartos, [class*="bedroom"], [class*="quarto"]'
+}
+
+AREA_RE = re.compile(r'(\d{2,5}(?:[.,]\d+)?)\s*m(?:²|2)(?!\w)', re.I)
+BEDROOMS_RE = re.compile(r'(\d{1,2})\s*(?:quartos?|dormit[óo]rios?|dorms?\b)', re.I)
+
+
+def write_json_atomic(path: str, data, **options):
+    """Grava JSON num .tmp e troca pelo arquivo final: quem cair no meio não deixa o arquivo corrompido"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **options)
+    os.replace(tmp_path, path)
+
+
+class DetailCache:
+    """Dados já extraídos das páginas de detalhe, persistidos em JSON para não rebaixá-las
+    
+    O arquivo só é lido no primeiro get/put (--list-sites e os workers de parse
+    não pagam por ele); entradas mais velhas que ttl são descartadas ao salvar.
+    """
+
+    def __init__(self, path: str = '.house_finder_cache/details.json', ttl: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def entries(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    try:
+                        with open(self.path, 'r', encoding='utf-8') as f:
+                            self._entries = json.load(f)
+                    except (OSError, ValueError):
+                        self._entries = {}
+        return self._entries
+
+    def get(self, url: str) -> Optional[Dict]:
+        entry = self.entries.get(normalize_url(url))
+        if entry and time.time() - entry.get('fetched_at', 0) < self.ttl:
+            return entry
+        return None
+
+    def put(self, url: str, details: Dict):
+        entries = self.entries
+        with self._lock:
+            entries[normalize_url(url)] = dict(details, fetched_at=time.time())
+
+    def save(self):
+        if self._entries is None:
+            return
+        with self._lock:
+            cutoff = time.time() - self.ttl
+            self._entries = {url: entry for url, entry in self._entries.items()
+                             if entry.get('fetched_at', 0) >= cutoff}
+            write_json_atomic(self.path, self._entries)
+
+
+class SiteHealth:
+    """Saúde de cada site entre execuções: taxa de sucesso, latência e último status
+    
+    Sites com falhas seguidas (404, 403, DNS, timeouts) ficam suspensos por um
+    período que dobra a cada nova falha, até voltarem a responder.
+    """
+
+    def __init__(self, path: str = '.house_finder_cache/site_health.json', max_failures: int = 3,
+                 base_cooldown: float = 3600, max_cooldown: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_failures = max_failures
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.sites = json.load(f)
+        except (OSError, ValueError):
+            self.sites = {}
+
+    def _entry(self, site_name: str) -> Dict:
+        return self.sites.setdefault(site_name, {
+            'requests': 0,
+            'successes': 0,
+            'consecutive_failures': 0,
+            'avg_latency': None,
+            'last_status': None,
+            'last_error': None,
+            'last_checked': None,
+            'skip_until': 0
+        })
+
+    def record(self, site_name: str, status: Optional[int] = None, latency: Optional[float] = None,
+               error: Optional[str] = None):
+        """Registra o resultado de uma requisição ao site (status HTTP ou tipo de erro)"""
+        with self._lock:
+            entry = self._entry(site_name)
+            entry['requests'] += 1
+            entry['last_status'] = status
+            entry['last_error'] = error
+            entry['last_checked'] = datetime.now().isoformat(timespec='seconds')
+            if latency is not None:
+                previous = entry['avg_latency']
+                entry['avg_latency'] = latency if previous is None else 0.7 * previous + 0.3 * latency
+            
+            if error is None and status is not None and status < 400:
+                entry['successes'] += 1
+                entry['consecutive_failures'] = 0
+                entry['skip_until'] = 0
+                return
+            
+            entry['consecutive_failures'] += 1
+            if entry['consecutive_failures'] >= self.max_failures:
+                extra_failures = entry['consecutive_failures'] - self.max_failures
+                cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** extra_failures)
+                entry['skip_until'] = time.time() + cooldown
+
+    def should_skip(self, site_name: str) -> bool:
+        entry = self.sites.get(site_name)
+        return bool(entry) and entry.get('skip_until', 0) > time.time()
+
+    def reset(self, site_name: str):
+        """Esquece as falhas do site (ex.: ao habilitá-lo manualmente)"""
+        with self._lock:
+            entry = self._entry(site_name)
+            entry['consecutive_failures'] = 0
+            entry['skip_until'] = 0
+
+    def describe(self, site_name: str) -> str:
+        """Resumo legível da saúde do site"""
+        entry = self.sites.get(site_name)
+        if not entry or not entry['requests']:
+            return 'sem histórico'
+        parts = [f"{entry['successes'] / entry['requests']:.0%} sucesso"]
+        if entry['avg_latency'] is not None:
+            parts.append(f"{entry['avg_latency']:.1f}s")
+        parts.append(f"último: {entry['last_error'] or entry['last_status']}")
+        if self.should_skip(site_name):
+            parts.append(f"suspenso até {datetime.fromtimestamp(entry['skip_until']).strftime('%d/%m %H:%M')}")
+        return ', '.join(parts)
+
+    def save(self):
+        with self._lock:
+            write_json_atomic(self.path, self.sites, indent=2)
+
+
+class LearnedSelectors:
+    """Seletores de cards descobertos por site (discover_card_selector), persistidos em JSON
+    
+    Quando o seletor configurado deixa de funcionar, as execuções seguintes vão
+    direto ao seletor aprendido em vez de repetir a descoberta ou os fallbacks.
+    Só o processo principal aprende e grava: os workers de parse devolvem o
+    seletor descoberto junto com a página. Com path=None fica só em memória.
+    """
+
+    def __init__(self, path: Optional[str] = '.house_finder_cache/learned_selectors.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self.sites = {}
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.sites = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def get(self, site_name: str) -> Optional[str]:
+        entry = self.sites.get(site_name)
+        return entry['selector'] if entry else None
+
+    def learn(self, site_name: str, selector: str, cards: int):
+        with self._lock:
+            if self.get(site_name) == selector:
+                return
+            self.sites[site_name] = {'selector': selector, 'cards': cards,
+                                     'learned_at': datetime.now().isoformat(timespec='seconds')}
+        self.save()
+
+    def forget(self, site_name: str):
+        with self._lock:
+            if self.sites.pop(site_name, None) is None:
+                return
+        self.save()
+
+    def save(self):
+        # Chamado a cada mudança (raras)
+        if not self.path:
+            return
+        with self._lock:
+            write_json_atomic(self.path, self.sites, indent=2)
+
+
+def connection_error_kind(error: Exception) -> str:
+    """Classifica falhas de rede para o histórico de saúde dos sites"""
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    message = str(error)
+    if 'NameResolutionError' in message or 'Failed to resolve' in message or 'Name or service not known' in message:
+        return 'dns'
+    return 'connection'
+
+
+class ListingSink:
+    """Grava cada imóvel aceito assim que ele chega, em JSON Lines e CSV
+    
+    Os arquivos são atualizados (flush) a cada imóvel, então uma execução que
+    cair no meio mantém tudo o que já foi encontrado.
+    """
+
+    FIELDS = Listing.FIELDS
+
+    def __init__(self, filename: str = 'casas_sjdr_parcial'):
+        self.filename = filename
+        self.count = 0
+        self._lock = threading.Lock()
+        self._jsonl = open(f'{filename}.jsonl', 'w', encoding='utf-8')
+        self._csv_file = open(f'{filename}.csv', 'w', encoding='utf-8', newline='')
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=self.FIELDS, extrasaction='ignore')
+        self._csv.writeheader()
+        self._csv_file.flush()
+
+    def write(self, listing: Listing):
+        # Chamado pelos workers de vários sites ao mesmo tempo
+        with self._lock:
+            self._jsonl.write(json.dumps(listing.to_dict(), ensure_ascii=False) + '\n')
+            self._csv.writerow(listing)
+            self._jsonl.flush()
+            self._csv_file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._jsonl.close()
+            self._csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read(self, local: Optional[bool] = None) -> Iterator[Listing]:
+        """Relê os imóveis gravados (depois de close), um por vez; local filtra por is_local"""
+        with open(f'{self.filename}.jsonl', 'r', encoding='utf-8') as f:
+            for line in f:
+                listing = Listing.from_dict(json.loads(line))
+                if local is None or listing.is_local == local:
+                    yield listing
+
+
+class ChangeNotifier:
+    """Destino dos alertas do modo --watch: stdout ('-'), arquivo JSON Lines ou webhook (URL http)
+    
+    Recebe só os anúncios novos ou com preço alterado, já com 'status' e
+    'previous_price' (ver ListingStore.record).
+    """
+
+    def __init__(self, target: str = '-'):
+        self.target = target
+        self.sent = 0
+
+    def notify(self, site_name: str, changes: List[Listing]):
+        if not changes:
+            return
+        if self.target == '-':
+            for listing in changes:
+                if listing.status == 'price_changed':
+                    note = f"💲 preço alterado (antes: {format_brl(listing.previous_price)})"
+                else:
+                    note = "🆕 novo"
+                print(f"[{datetime.now():%H:%M:%S}] {listing.site}: {listing.title} - {listing.price_formatted} "
+                      f"- {note}\n    {listing.url}", flush=True)
+        elif self.target.startswith(('http://', 'https://')):
+            payload = {'site': site_name, 'changes': [listing.to_dict() for listing in changes]}
+            try:
+                response = requests.post(self.target, json=payload, timeout=10)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"⚠️ Webhook {self.target} falhou: {e}")
+                return
+        else:
+            notified_at = datetime.now().isoformat(timespec='seconds')
+            with open(self.target, 'a', encoding='utf-8') as f:
+                for listing in changes:
+                    f.write(json.dumps(dict(listing.to_dict(), notified_at=notified_at), ensure_ascii=False) + '\n')
+        self.sent += len(changes)
+
+
+class RunMetrics:
+    """Métricas da execução por site e por etapa: tempos, bytes e contadores
+    
+    Gravadas em JSON ao final do run() e, opcionalmente, no formato texto do
+    Prometheus (para o textfile collector do node_exporter).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.sites = {}
+        self.run = {'stages': {}, 'counters': {}}
+
+    def _bucket(self, site_name: Optional[str]) -> Dict:
+        if site_name is None:
+            return self.run
+        return self.sites.setdefault(site_name, {'stages': {}, 'counters': {}})
+
+    def observe(self, site_name: Optional[str], stage: str, seconds: float):
+        """Soma a duração de uma etapa (site_name=None para etapas globais)"""
+        with self._lock:
+            stage_data = self._bucket(site_name)['stages'].setdefault(
+                stage, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            stage_data['count'] += 1
+            stage_data['seconds'] += seconds
+            stage_data['max_seconds'] = max(stage_data['max_seconds'], seconds)
+
+    def count(self, site_name: Optional[str], counter: str, amount: int = 1):
+        with self._lock:
+            counters = self._bucket(site_name)['counters']
+            counters[counter] = counters.get(counter, 0) + amount
+
+    def merge(self, site_name: Optional[str], bucket: Dict):
+        """Soma as métricas medidas em outro processo (workers de parse)"""
+        with self._lock:
+            target = self._bucket(site_name)
+            for stage, values in bucket.get('stages', {}).items():
+                stage_data = target['stages'].setdefault(stage, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+                stage_data['count'] += values['count']
+                stage_data['seconds'] += values['seconds']
+                stage_data['max_seconds'] = max(stage_data['max_seconds'], values['max_seconds'])
+            for counter, amount in bucket.get('counters', {}).items():
+                target['counters'][counter] = target['counters'].get(counter, 0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return json.loads(json.dumps({
+                'started_at': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                'duration_seconds': time.time() - self.started,
+                'run': self.run,
+                'sites': self.sites
+            }))
+
+    def to_prometheus(self) -> str:
+        """Exporta as métricas no formato texto do Prometheus"""
+        data = self.snapshot()
+        
+        def labels(**values) -> str:
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values.values())
+            return '{' + ','.join(f'{k}="{v}"' for k, v in zip(values, escaped)) + '}'
+        
+        buckets = [('_run', data['run'])] + sorted(data['sites'].items())
+        lines = [
+            '# HELP house_finder_run_duration_seconds Duração da última execução',
+            '# TYPE house_finder_run_duration_seconds gauge',
+            f"house_finder_run_duration_seconds {data['duration_seconds']:.6f}",
+            '# HELP house_finder_run_timestamp_seconds Início da última execução (epoch)',
+            '# TYPE house_finder_run_timestamp_seconds gauge',
+            f'house_finder_run_timestamp_seconds {self.started:.3f}',
+        ]
+        for name, kind, help_text, key in (
+                ('house_finder_stage_seconds_total', 'counter', 'Tempo total gasto na etapa', 'seconds'),
+                ('house_finder_stage_calls_total', 'counter', 'Execuções da etapa', 'count'),
+                ('house_finder_stage_max_seconds', 'gauge', 'Execução mais lenta da etapa', 'max_seconds')):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for site_name, bucket in buckets:
+                for stage, values in sorted(bucket['stages'].items()):
+                    lines.append(f'{name}{labels(site=site_name, stage=stage)} {values[key]:.6g}')
+        lines += ['# HELP house_finder_events_total Contadores por site (páginas, bytes, cards, rejeições...)',
+                  '# TYPE house_finder_events_total counter']
+        for site_name, bucket in buckets:
+            for counter, value in sorted(bucket['counters'].items()):
+                lines.append(f'house_finder_events_total{labels(site=site_name, event=counter)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def save(self, filename: str = 'casas_sjdr_metricas', prometheus: bool = False):
+        """Grava <filename>.json e, com prometheus=True, <filename>.prom"""
+        with open(f'{filename}.json', 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        if prometheus:
+            # Escrita atômica: o node_exporter pode ler o arquivo a qualquer momento
+            tmp_path = f'{filename}.prom.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, f'{filename}.prom')
+
+
+class CompiledTemplate:
+    """Template com campos {{nome}}, dividido uma única vez em trechos fixos e campos
+    
+    render(**campos) só preenche as posições dos campos e junta os trechos com
+    ''.join, sem reinterpretar o template. As chaves do CSS e do JavaScript não
+    precisam ser escapadas no texto.
+    """
+
+    FIELD_RE = re.compile(r'\{\{(\w+)\}\}')
+
+    def __init__(self, text: str):
+        # Posições ímpares do split são os nomes dos campos
+        self.pieces = self.FIELD_RE.split(text)
+        self.slots = [(position, self.pieces[position]) for position in range(1, len(self.pieces), 2)]
+        self.fields = list(dict.fromkeys(name for _, name in self.slots))
+
+    def render(self, **values) -> str:
+        pieces = self.pieces.copy()
+        for position, name in self.slots:
+            pieces[position] = str(values[name])
+        return ''.join(pieces)
+
+
+REPORT_HEAD = CompiledTemplate("""<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Casas Encontradas - {{city}}</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f5f5; }
+        .header { background: linear-gradient(135deg, #2c3e50, #3498db); color: white; padding: 20px; border-radius: 10px; margin-bottom: 20px; }
+        .stats { display: flex; justify-content: space-around; margin: 20px 0; }
+        .stat-box { background: white; padding: 15px; border-radius: 8px; text-align: center; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+        .section-title { background-color: #34495e; color: white; padding: 15px; border-radius: 5px; margin: 20px 0 10px 0; }
+        .property { border: 1px solid #ddd; margin: 10px 0; padding: 15px; border-radius: 8px; background: white; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+        .property.local { border-left: 5px solid #e74c3c; }
+        .property.national { border-left: 5px solid #3498db; }
+        .price { color: #27ae60; font-weight: bold; font-size: 18px; }
+        .site { padding: 5px 10px; border-radius: 3px; font-size: 12px; color: white; display: inline-block; margin-bottom: 5px; }
+        .site.local { background-color: #e74c3c; }
+        .site.national { background-color: #3498db; }
+        .address { color: #7f8c8d; margin: 5px 0; }
+        .pager { text-align: center; margin: 20px 0; }
+        .pager button { padding: 8px 16px; margin: 0 10px; }
+        a { color: #2980b9; text-decoration: none; }
+        a:hover { text-decoration: underline; }
+        .no-results { text-align: center; color: #7f8c8d; padding: 40px; }
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>🏠 Casas Encontradas - {{city}}</h1>
+        <p>{{criteria}}</p>
+    </div>
+
+    <div class="stats">
+        <div class="stat-box">
+            <h3>{{total}}</h3>
+            <p>Total de Imóveis</p>
+        </div>
+        <div class="stat-box">
+            <h3>{{local_count}}</h3>
+            <p>Imobiliárias Locais</p>
+        </div>
+        <div class="stat-box">
+            <h3>{{national_count}}</h3>
+            <p>Portais Nacionais</p>
+        </div>
+        <div class="stat-box">
+            <h3>{{min_price}}</h3>
+            <p>Menor Preço</p>
+        </div>
+    </div>
+""")
+
+REPORT_SECTION = CompiledTemplate("""
+    <div class="section-title">
+        {{title}} ({{count}} imóveis)
+    </div>
+""")
+
+REPORT_CARD = CompiledTemplate("""
+    <div class="property {{kind}}">
+        <span class="site {{kind}}">{{site}}</span>
+        <h3>{{title}}</h3>
+        <div class="price">{{price}}</div>
+        <div class="address">📍 {{address}}</div>
+        {{link}}
+    </div>
+""")
+
+REPORT_EMPTY = """
+    <div class="no-results">
+        <h3>❌ Nenhum imóvel encontrado</h3>
+        <p>Tente ajustar os critérios de busca ou verificar novamente mais tarde.</p>
+    </div>
+"""
+
+# Relatórios grandes: os dados vão como JSON e o navegador monta uma página de cards por vez
+REPORT_PAGED_SCRIPT = CompiledTemplate("""
+    <div id="listings"></div>
+    <div class="pager">
+        <button id="prev">◀ Anteriores</button>
+        <span id="page-info"></span>
+        <button id="next">Próximos ▶</button>
+    </div>
+    <script>
+        const listings = JSON.parse(document.getElementById('listing-data').textContent);
+        const pageSize = {{page_size}};
+        let page = 0;
+        // Mesmo escape do html.escape(quote=True) do relatório estático: os valores também vão em atributos
+        const ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'};
+        function esc(value) {
+            return (value == null ? '' : String(value)).replace(/[&<>"']/g, c => ESCAPES[c]);
+        }
+        function render() {
+            const pages = Math.max(1, Math.ceil(listings.length / pageSize));
+            page = Math.min(Math.max(page, 0), pages - 1);
+            document.getElementById('listings').innerHTML = listings
+                .slice(page * pageSize, (page + 1) * pageSize)
+                .map(p => {
+                    const kind = p.is_local ? 'local' : 'national';
+                    const link = p.url ? `<a href="${esc(p.url)}" target="_blank">🔗 ${p.is_local ? 'Ver no site da imobiliária' : 'Ver detalhes'}</a>` : '';
+                    return `<div class="property ${kind}"><span class="site ${kind}">${esc(String(p.site).toUpperCase())}</span>`
+                        + `<h3>${esc(p.title)}</h3><div class="price">${esc(p.price_formatted)}</div>`
+                        + `<div class="address">📍 ${esc(p.address)}</div>${link}</div>`;
+                })
+                .join('');
+            document.getElementById('page-info').textContent = `Página ${page + 1} de ${pages}`;
+        }
+        document.getElementById('prev').onclick = () => { page--; render(); window.scrollTo(0, 0); };
+        document.getElementById('next').onclick = () => { page++; render(); window.scrollTo(0, 0); };
+        render();
+    </script>
+""")
+
+REPORT_TAIL = """
+</body>
+</html>
+"""
+
+
 class HouseFinder:
     def __init__(self):
         self.max_price = 350000
+        self.min_price = 50000  # Preço mínimo para evitar erros de extração
         self.target_neighborhoods = ['centro', 'segredo', 'bairro segredo']
         self.city = 'são joão del rei'
-        self.session = requests.Session()
         
-        # Headers mais realistas para evitar bloqueios
-        self.session.headers.update({
+        # Sessão HTTP criada sob demanda (ver propriedade session)
+        self._session = None
+        self._session_lock = threading.Lock()
+        
+        # Pool de conexões: conexões mantidas por host (site + prefetch + detalhes em paralelo)
+        # e hosts com pool próprio; http2 usa o httpx (opcional) para multiplexar num só TLS
+        self.pool_maxsize = 8
+        self.pool_hosts = 20
+        self.http2 = False
+
+        # Busca concorrente: um worker por site, ritmo controlado por host
+        self.max_workers = 6
+        self.site_delays = {'local': 3, 'national': 2}
+        self.rate_limiter = HostRateLimiter(default_delay=self.site_delays['national'])
+        
+        # Saúde dos sites: sites que falham seguidamente são suspensos automaticamente
+        self.site_health = SiteHealth()
+        
+        # Novas tentativas em 429/403/5xx e falhas de conexão
+        self.max_retries = 2
+        self.retry_statuses = {403, 429, 500, 502, 503, 504}
+        
+        # Paginação: limites padrão por site (podem ser sobrescritos em self.sites)
+        self.max_pages = 5
+        self.max_listings_per_site = 200
+        
+        # Cache HTTP em disco: execuções seguidas revalidam em vez de baixar tudo de novo
+        self.cache = ResponseCache()
+        
+        # Grava cada imóvel aceito em disco durante a busca (casas_sjdr_parcial.jsonl/.csv)
+        self.stream_output = True
+        
+        # Modo --watch: intervalo padrão entre buscas de um mesmo site (por site: 'watch_interval')
+        self.watch_interval = 900
+        self._watch_prices = {}  # Preços vistos, quando não há histórico em disco (store=None)
+        
+        # Modo lote: downloads idênticos entre consultas são feitos uma vez só (ver for_query)
+        self.fetch_memo = None
+        
+        # Relatório HTML: acima do limite, os cards são montados no navegador em páginas
+        self.report_paged_threshold = 500
+        self.report_page_size = 100
+        
+        # Tempos por etapa e contadores por site (casas_sjdr_metricas.json, .prom com --prometheus)
+        self.metrics = RunMetrics()
+        self.prometheus_output = False
+        
+        # Enriquecimento opcional com as páginas de detalhe (modo --enrich)
+        self.enrich_details = False
+        self.enrichment_workers = 4
+        self.detail_cache = DetailCache()
+        
+        # Deduplicação aproximada entre portais
+        self.deduplicator = ListingDeduplicator()
+        
+        # Histórico de anúncios entre execuções (modo --incremental)
+        self.store = ListingStore()
+        
+        # Backend de parse (pode ser sobrescrito por site com a chave 'parser')
+        self.parser = DEFAULT_PARSER
+        self._strainers = {}
+        
+        # Seletores de cards descobertos quando os configurados falham (None desativa a persistência)
+        self.learned_selectors = LearnedSelectors()
+        
+        # Parse em processos separados (--parse-workers N): as threads de I/O só baixam
+        # e entregam os bytes; a fila limita as páginas esperando parse (padrão: 2 por worker)
+        self.parse_workers = 0
+        self.parse_queue_size = None
+        self._parse_pool = None
+        self._parse_pool_lock = threading.Lock()
+        self._parse_slots = None
+        
+        # Headers mais realistas para evitar bloqueios (Accept-Encoding é definido
+        # na criação da sessão, só com as compressões que sabemos decodificar)
+        self.session_headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
             'DNT': '1',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
             'Sec-Fetch-Dest': 'document',
             'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
+            'Sec-Fetch-Site': 'cross-site',
             'Cache-Control': 'max-age=0'
-        })
-        self.results = []
+        }
         
         # Sites de imobiliárias (portais nacionais + locais de SJDR)
         self.sites = {
@@ -92,6 +1969,7 @@ class HouseFinder:
             'vivareal': {
                 'base_url': 'https://www.vivareal.com.br',
                 'search_url': 'https://www.vivareal.com.br/venda/minas-gerais/sao-joao-del-rei/casa_residencial/',
+                'search_url_template': 'https://www.vivareal.com.br/venda/{state_name}/{city_slug}/casa_residencial/',
                 'selectors': {
                     'property': '.property-card__container, .result-card',
                     'title': '.property-card__title, .result-card__title',
@@ -99,11 +1977,14 @@ class HouseFinder:
                     'address': '.property-card__address, .result-card__address',
                     'link': 'a'
                 },
+                'pagination': {'param': 'pagina'},
+                'embedded_json': True,
                 'active': True
             },
             'zapimoveis': {
                 'base_url': 'https://www.zapimoveis.com.br',
                 'search_url': 'https://www.zapimoveis.com.br/venda/casas/mg+sao-joao-del-rei/',
+                'search_url_template': 'https://www.zapimoveis.com.br/venda/casas/{state}+{city_slug}/',
                 'selectors': {
                     'property': '[data-testid="property-card"], .card-container',
                     'title': '[data-testid="property-card-title"], .card__title',
@@ -111,6 +1992,8 @@ class HouseFinder:
                     'address': '[data-testid="property-card-address"], .card__address',
                     'link': 'a'
                 },
+                'pagination': {'param': 'pagina'},
+                'embedded_json': True,
                 'active': True
             },
             
@@ -118,6 +2001,7 @@ class HouseFinder:
             'olx': {
                 'base_url': 'https://mg.olx.com.br',
                 'search_url': 'https://mg.olx.com.br/regiao-de-sao-joao-del-rei/imoveis/casas-venda',
+                'search_url_template': 'https://{state}.olx.com.br/regiao-de-{city_slug}/imoveis/casas-venda',
                 'selectors': {
                     'property': '[data-ds-component="DS-NEW-VERTICAL-LIST-ITEM"]',
                     'title': 'h2',
@@ -125,6 +2009,8 @@ class HouseFinder:
                     'address': '[data-testid="location"]',
                     'link': 'a'
                 },
+                'pagination': {'param': 'o'},
+                'embedded_json': True,
                 'active': False  # Desabilitado por enquanto devido a bloqueios
             },
             
@@ -139,6 +2025,7 @@ class HouseFinder:
                     'address': '.endereco, .address, .localizacao',
                     'link': 'a'
                 },
+                'pagination': {'next': 'a[rel="next"], .pagination .next a, .paginacao .proxima a'},
                 'active': False  # Desabilitado - site pode não existir
             },
             'lc_imoveis': {
@@ -151,6 +2038,7 @@ class HouseFinder:
                     'address': '.endereco, .address',
                     'link': 'a'
                 },
+                'pagination': {'next': 'a[rel="next"], .pagination .next a, .paginacao .proxima a'},
                 'active': False  # Desabilitado - site pode não existir
             },
             'maxima_imoveis': {
@@ -163,185 +2051,640 @@ class HouseFinder:
                     'address': '.endereco, .address, .local',
                     'link': 'a'
                 },
+                'pagination': {'next': 'a[rel="next"], .pagination .next a, .paginacao .proxima a'},
                 'active': False  # Desabilitado - site pode não existir
             }
         }
+        
+        # Seletores compilados uma vez por site, no primeiro uso
+        self.selector_plans = {}
+        self._compiled_selectors = {}
 
-    def clean_price(self, price_text: str) -> Optional[float]:
-        """Limpa e converte texto de preço para float"""
-        if not price_text:
-            return None
+    @property
+    def session(self):
+        """Sessão HTTP compartilhada, criada só quando a primeira página é buscada"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self.create_session()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def create_session(self):
+        """requests.Session com pool dimensionado para os workers, ou sessão HTTP/2 com --http2"""
+        if self.http2:
+            if importlib.util.find_spec('httpx') and importlib.util.find_spec('h2'):
+                session = Http2Session(max_connections=self.pool_hosts * self.pool_maxsize)
+                session.headers.update(self.session_headers)
+                session.headers['Accept-Encoding'] = accept_encoding()
+                return session
+            logging.warning("⚠️ HTTP/2 requer 'httpx[http2]' - usando HTTP/1.1")
         
-        # Remove caracteres não numéricos exceto pontos e vírgulas
-        price_clean = re.sub(r'[^\d.,]', '', price_text)
-        
-        # Trata formato brasileiro (vírgula decimal, ponto milhares)
-        if ',' in price_clean and '.' in price_clean:
-            # Formato: 123.456,78
-            price_clean = price_clean.replace('.', '').replace(',', '.')
-        elif ',' in price_clean:
-            # Formato: 123456,78 ou 123,45
-            if len(price_clean.split(',')[1]) <= 2:
-                price_clean = price_clean.replace(',', '.')
-            else:
-                price_clean = price_clean.replace(',', '')
+        session = requests.Session()
+        # Sem pool suficiente, workers simultâneos no mesmo host descartam conexões e refazem o TLS
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_hosts, pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(self.session_headers)
+        session.headers['Accept-Encoding'] = accept_encoding()
+        return session
+
+    def connection_stats(self) -> Dict[str, Dict]:
+        """Requisições e conexões abertas por host desde a criação da sessão"""
+        if self._session is None:
+            return {}
+        if isinstance(self._session, Http2Session):
+            return self._session.connection_stats()
+        stats = {}
+        for adapter in set(self._session.adapters.values()):
+            pools = getattr(getattr(adapter, 'poolmanager', None), 'pools', None)
+            if pools is None:
+                continue
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = stats.setdefault(pool.host, {'requests': 0, 'connections': 0})
+                host['requests'] += pool.num_requests
+                host['connections'] += pool.num_connections
+        return stats
+
+    def record_connection_stats(self):
+        """Registra o reaproveitamento de conexões nas métricas e no log"""
+        for host, stats in sorted(self.connection_stats().items()):
+            reused = max(stats['requests'] - stats['connections'], 0)
+            self.metrics.count(None, 'http_requests', stats['requests'])
+            self.metrics.count(None, 'http_connections_opened', stats['connections'])
+            if stats['requests']:
+                logging.info(f"🔌 {host}: {stats['requests']} requisições em {stats['connections']} conexões "
+                             f"({reused / stats['requests']:.0%} reaproveitadas)")
+
+    @property
+    def parse_pool(self) -> 'ProcessPoolExecutor':
+        """Pool de processos de parse (--parse-workers), criado na primeira página
         
-        try:
-            return float(price_clean)
-        except ValueError:
-            return None
+        Usa 'spawn': o processo principal já tem threads de I/O rodando, e um fork
+        poderia herdar locks presos. Os workers logam só no console.
+        """
+        if self._parse_pool is None:
+            with self._parse_pool_lock:
+                if self._parse_pool is None:
+                    # Só com --parse-workers: carregar multiprocessing custa ~13 ms na inicialização
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+                    queue_size = self.parse_queue_size or 2 * self.parse_workers
+                    self._parse_slots = threading.BoundedSemaphore(queue_size)
+                    self._parse_pool = ProcessPoolExecutor(
+                        max_workers=self.parse_workers, mp_context=multiprocessing.get_context('spawn'),
+                        initializer=setup_logging, initargs=(None,))
+                    logging.info(f"🧮 Parse em {self.parse_workers} processos (até {queue_size} páginas na fila)")
+        return self._parse_pool
+
+    def close_parse_pool(self):
+        """Encerra os processos de parse ao fim da execução"""
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(cancel_futures=True)
+            self._parse_pool = None
+
+    def parse_settings(self) -> Dict:
+        """Critérios que o parse usa, enviados a cada página para os workers de parse"""
+        return {
+            'max_price': self.max_price,
+            'min_price': self.min_price,
+            'target_neighborhoods': self.target_neighborhoods,
+            'city': self.city,
+            'enrich_details': self.enrich_details,
+            'parser': self.parser
+        }
+
+    def get_selector_plan(self, site_name: str, site_config: Dict) -> SelectorPlan:
+        """Plano de seletores do site, compilado no primeiro uso"""
+        plan = self.selector_plans.get(site_name)
+        if plan is None:
+            plan = self.selector_plans[site_name] = SelectorPlan(site_config['selectors'])
+        return plan
+
+    def clean_price(self, price_text: str) -> Optional[float]:
+        """Limpa e converte texto de preço para float (ver parse_price; em lote, normalize_prices)"""
+        return parse_price(price_text)
 
     def is_target_neighborhood(self, address: str) -> bool:
         """Verifica se o endereço está nos bairros alvo"""
         if not address:
             return False
         
-        address_lower = address.lower()
-        return any(neighborhood in address_lower for neighborhood in self.target_neighborhoods)
+        # Sem bairros alvo (consultas do modo lote): qualquer bairro da cidade serve
+        if not self.target_neighborhoods:
+            return True
+        
+        return neighborhood_index(tuple(self.target_neighborhoods)).find(address) is not None
 
-    def scrape_site(self, site_name: str, site_config: Dict) -> List[Dict]:
-        """Faz scraping de um site específico com proteção contra bloqueios"""
-        results = []
+    def is_vague_address(self, address: str) -> bool:
+        """Endereço que só informa a cidade/estado (ex.: 'São João del Rei, MG')"""
+        remaining = fold_text(address or '')
+        for token in (fold_text(self.city), 'minas gerais', 'mg', 'brasil'):
+            remaining = re.sub(rf'\b{re.escape(token)}\b', ' ', remaining)
+        return not remaining.strip()
+
+    def build_page_url(self, site_config: Dict, page: int) -> Optional[str]:
+        """Monta a URL da página N quando o site pagina por parâmetro na query string"""
+        if page == 1:
+            return site_config['search_url']
         
-        try:
-            logging.info(f"Buscando em {site_name}...")
-            
-            # Headers específicos para cada site
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'cross-site',
-                'Cache-Control': 'max-age=0',
-                'DNT': '1'
-            }
+        param = site_config.get('pagination', {}).get('param')
+        if not param:
+            return None
+        
+        parsed = urlparse(site_config['search_url'])
+        query = [(k, v) for k, v in parse_qsl(parsed.query) if k != param]
+        query.append((param, str(page)))
+        return parsed._replace(query=urlencode(query)).geturl()
+
+    def find_next_page_url(self, soup, site_config: Dict, current_url: str) -> Optional[str]:
+        """Procura o link de próxima página usando os seletores de paginação do site"""
+        next_selectors = site_config.get('pagination', {}).get('next')
+        if not next_selectors:
+            return None
+        
+        for selector in next_selectors.split(', '):
+            link_elem = soup.select_one(selector.strip())
+            if link_elem and link_elem.get('href'):
+                return urljoin(current_url, link_elem.get('href'))
+        return None
+
+    def fetch_page(self, site_name: str, site_config: Dict, url: str, record_health: bool = True):
+        """Baixa uma página de resultados (ou a serve do cache); retorna None em erros HTTP conhecidos
+        
+        Com record_health, o resultado entra no histórico de saúde do site
+        (páginas de detalhe não contam: um anúncio removido não indica site fora do ar).
+        No modo lote, a mesma URL pedida por várias consultas é baixada uma vez só.
+        """
+        if self.fetch_memo is not None:
+            return self.fetch_memo.fetch(url, lambda: self.download_page(site_name, site_config, url, record_health))
+        return self.download_page(site_name, site_config, url, record_health)
+
+    def download_page(self, site_name: str, site_config: Dict, url: str, record_health: bool = True):
+        """Download efetivo de fetch_page, com cache, novas tentativas e métricas"""
+        health = self.site_health if record_health else None
+        # Páginas de detalhe têm métricas próprias (prefixo detail_)
+        prefix = '' if record_health else 'detail_'
+        cached_meta = self.cache.get(url) if self.cache else None
+        if cached_meta and self.cache.is_fresh(cached_meta):
+            cached_page = self.cache.load(url, cached_meta)
+            if cached_page is not None:
+                logging.info(f"💾 {site_name}: Usando cache para {url}")
+                self.metrics.count(site_name, f'{prefix}cache_hits')
+                return cached_page
+        
+        is_local_site = site_name not in ['vivareal', 'zapimoveis', 'olx']
+        delay = site_config.get('delay', self.site_delays['local' if is_local_site else 'national'])
+        
+        # Os headers fixos ficam na sessão; por requisição só vão os de revalidação do cache
+        headers = self.cache.conditional_headers(cached_meta) if cached_meta else None
+        
+        for attempt in range(self.max_retries + 1):
+            # Respeita o ritmo (e eventuais pausas de backoff) do host
+            self.rate_limiter.acquire(url, delay)
             
             # Timeout maior para evitar erros de conexão
+            started = time.monotonic()
             try:
                 response = self.session.get(
-                    site_config['search_url'], 
+                    url, 
                     headers=headers, 
                     timeout=20, 
                     allow_redirects=True
                 )
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                self.metrics.count(site_name, f'{prefix}errors_{connection_error_kind(e)}')
+                if attempt == self.max_retries or connection_error_kind(e) == 'dns':
+                    self.rate_limiter.on_failure(url)
+                    if health:
+                        health.record(site_name, latency=time.monotonic() - started, error=connection_error_kind(e))
+                    raise
+                backoff = self.rate_limiter.on_failure(url)
+                self.metrics.count(site_name, f'{prefix}retries')
+                logging.info(f"🔁 {site_name}: Falha de conexão - nova tentativa em {backoff:.1f}s ({attempt+1}/{self.max_retries})")
+                continue
+            
+            self.record_response_metrics(site_name, prefix, response, time.monotonic() - started)
+            
+            if response.status_code in self.retry_statuses:
+                backoff = self.rate_limiter.on_failure(url, parse_retry_after(response.headers.get('Retry-After')))
+                if attempt < self.max_retries:
+                    self.metrics.count(site_name, f'{prefix}retries')
+                    logging.info(f"🔁 {site_name}: HTTP {response.status_code} - nova tentativa em {backoff:.1f}s ({attempt+1}/{self.max_retries})")
+                    continue
+            else:
+                self.rate_limiter.on_success(url)
+            
+            if health:
+                health.record(site_name, status=response.status_code, latency=time.monotonic() - started)
+            
+            if response.status_code == 304 and cached_meta:
+                cached_page = self.cache.load(url, cached_meta)
+                if cached_page is not None:
+                    self.cache.touch(url, cached_meta)
+                    logging.info(f"💾 {site_name}: Página não modificada (304)")
+                    return cached_page
+            
+            try:
                 response.raise_for_status()
-                
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 403:
                     logging.warning(f"❌ {site_name}: Acesso bloqueado (403 Forbidden) - site protege contra bots")
-                    return results
                 elif e.response.status_code == 404:
                     logging.warning(f"❌ {site_name}: Página não encontrada (404) - URL pode estar incorreta")
-                    return results
                 else:
                     logging.warning(f"❌ {site_name}: Erro HTTP {e.response.status_code}")
-                    return results
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Tenta múltiplos seletores para propriedades
-            properties = []
-            selectors = site_config['selectors']['property'].split(', ')
-            for selector in selectors:
-                props = soup.select(selector.strip())
-                if props:
-                    properties = props
-                    logging.info(f"✅ {site_name}: Usando seletor '{selector}' - encontradas {len(props)} propriedades")
-                    break
+                return None
             
-            if not properties:
-                # Fallback: busca por padrões comuns
-                fallback_selectors = [
-                    '.property', '.imovel', '.listing', '.card',
-                    '[class*="property"]', '[class*="imovel"]', 
-                    '[class*="listing"]', '[class*="card"]',
-                    '.result-card', '.search-result'
-                ]
-                for selector in fallback_selectors:
-                    props = soup.select(selector)
-                    if props:
-                        properties = props[:10]  # Limita para teste
-                        logging.info(f"🔄 {site_name}: Fallback seletor '{selector}' - {len(props)} elementos")
-                        break
+            if self.cache and response.status_code == 200:
+                self.cache.put(url, response)
+            return response
+
+    def record_response_metrics(self, site_name: str, prefix: str, response, elapsed: float):
+        """Registra tempos e bytes de uma resposta HTTP
+        
+        O requests não separa DNS e conexão: o TTFB (response.elapsed, até os
+        headers chegarem) inclui os dois quando a conexão é nova; o download é o
+        restante até o corpo ser lido.
+        """
+        ttfb = getattr(response, 'elapsed', None)
+        ttfb = min(ttfb.total_seconds(), elapsed) if ttfb is not None else elapsed
+        self.metrics.observe(site_name, f'{prefix}fetch', elapsed)
+        self.metrics.observe(site_name, f'{prefix}ttfb', ttfb)
+        self.metrics.observe(site_name, f'{prefix}download', elapsed - ttfb)
+        self.metrics.count(site_name, f'{prefix}requests')
+        self.metrics.count(site_name, f'{prefix}bytes', len(response.content or b''))
+        self.metrics.count(site_name, f'{prefix}http_{response.status_code}')
+
+    def learned_selector(self, site_name: str) -> Optional[str]:
+        return self.learned_selectors.get(site_name) if self.learned_selectors else None
+
+    def find_properties(self, site_name: str, site_config: Dict, soup, learning: Optional[Dict] = None) -> List:
+        """Localiza os cards de imóveis: seletores do site, seletor aprendido, descoberta e fallbacks
+        
+        Mudanças no seletor aprendido vão para `learning` (selector=None esquece o
+        aprendido); quem grava é record_learning, no processo principal.
+        """
+        # Tenta múltiplos seletores para propriedades
+        selector, props = self.get_selector_plan(site_name, site_config).find_cards(soup)
+        learned = self.learned_selector(site_name)
+        if props:
+            if learned and learning is not None:
+                # O seletor configurado voltou a funcionar (ou foi corrigido)
+                learning['selector'] = None
+            logging.info(f"✅ {site_name}: Usando seletor '{selector}' - encontradas {len(props)} propriedades")
+            return props
+        
+        # Seletor aprendido antes: revalidado só pelos primeiros cards
+        if learned:
+            props = compiled_selector(learned).select(soup)
+            if props and priced_cards(props, sample=5):
+                logging.info(f"🧠 {site_name}: Seletor aprendido '{learned}' - {len(props)} propriedades")
+                return props
+        
+        # Descoberta pela estrutura: um percurso do DOM em vez da cascata de seletores genéricos
+        discovered = discover_card_selector(soup)
+        if discovered:
+            selector, props = discovered
+            if learning is not None and selector != learned:
+                learning.update(selector=selector, cards=len(props))
+            logging.info(f"🧠 {site_name}: Seletor descoberto '{selector}' - {len(props)} propriedades")
+            return props
+        
+        if learned and learning is not None:
+            # O seletor aprendido parou de funcionar e não há outro: esquece para voltar ao parse restrito
+            learning['selector'] = None
+        
+        # Fallback: busca por padrões comuns
+        for selector, compiled in fallback_property_plan():
+            props = compiled.select(soup)
+            if props:
+                logging.info(f"🔄 {site_name}: Fallback seletor '{selector}' - {len(props)} elementos")
+                return props
+        
+        return []
+
+    def record_learning(self, site_name: str, learning: Optional[Dict]):
+        """Aplica (e grava) a mudança de seletor aprendido devolvida pelo parse de uma página"""
+        if not learning or self.learned_selectors is None:
+            return
+        if learning['selector'] is None:
+            self.learned_selectors.forget(site_name)
+        else:
+            self.learned_selectors.learn(site_name, learning['selector'], learning['cards'])
+
+    def extract_rows(self, site_name: str, site_config: Dict, properties: List, offset: int,
+                     rejected: Dict) -> List[tuple]:
+        """Campos de cada card em (posição, campos), prontos para filter_listings"""
+        # Um único percurso pelo card resolve todos os campos (seletores do site + fallbacks)
+        plan = self.get_selector_plan(site_name, site_config)
+        rows = []
+        for position, prop in enumerate(properties):
+            try:
+                fields = plan.extract(prop)
+                rows.append((position, {'title': fields['title'], 'price': fields['price'],
+                                        'address': fields['address'], 'href': fields['link']}))
+            except Exception as e:
+                rejected['error'] = rejected.get('error', 0) + 1
+                logging.debug(f"Erro ao processar propriedade {offset+position+1} de {site_name}: {e}")
+        return rows
+
+    def neighborhood_mask(self, addresses: List[str]) -> 'np.ndarray':
+        """is_target_neighborhood para uma lista de endereços"""
+        if not self.target_neighborhoods:
+            return np.ones(len(addresses), dtype=bool)
+        return neighborhood_index(tuple(self.target_neighborhoods)).mask(addresses)
+
+    def filter_listings(self, site_name: str, site_config: Dict, offset: int, rows: List[tuple],
+                        rejected: Dict) -> List[list]:
+        """Aplica os critérios a todos os cards de uma página de uma vez, com máscaras NumPy
+        
+        rows traz (posição, campos extraídos); retorna [posição, imóvel] dos aceitos
+        e conta os descartes em rejected.
+        """
+        if not rows:
+            return []
+        addresses = [fields['address'] or 'São João del Rei, MG' for _, fields in rows]
+        prices = normalize_prices([fields['price'] for _, fields in rows])
+        price_ok = (prices > self.min_price) & (prices <= self.max_price)
+        
+        # Para sites nacionais, verifica localização; para locais, assume que são da região
+        if site_name not in ['vivareal', 'zapimoveis', 'olx']:
+            location_ok = np.ones(len(rows), dtype=bool)
+        else:
+            location_ok = self.neighborhood_mask(addresses)
+        
+        # Card sem bairro: com enriquecimento ativo, a página de detalhe decide
+        pending = np.zeros(len(rows), dtype=bool)
+        if self.enrich_details:
+            for i in np.flatnonzero(price_ok & ~location_ok):
+                pending[i] = self.is_vague_address(addresses[i])
+        
+        for reason, mask in (('price', ~price_ok), ('neighborhood', price_ok & ~location_ok & ~pending)):
+            amount = int(mask.sum())
+            if amount:
+                rejected[reason] = rejected.get(reason, 0) + amount
+        
+        listings = []
+        for i in np.flatnonzero(price_ok & (location_ok | pending)):
+            position, fields = rows[i]
+            title = fields['title'] or placeholder_title(offset + position + 1, site_name.replace('_', ' ').title())
+            listings.append([position, self.listing_record(
+                site_name, site_config, title, float(prices[i]), addresses[i], fields['href'],
+                fields.get('area'), fields.get('bedrooms'), bool(pending[i])
+            )])
+        return listings
+
+    def listing_record(self, site_name: str, site_config: Dict, title: str, price: float, address: str,
+                       href: str, area: Optional[float] = None, bedrooms: Optional[int] = None,
+                       pending_location: bool = False) -> Listing:
+        """Registro final do imóvel (link absoluto), já aprovado nos critérios"""
+        is_local_site = site_name not in ['vivareal', 'zapimoveis', 'olx']
+        
+        # Constrói URL do imóvel
+        link_url = ''
+        if href:
+            if href.startswith('http'):
+                link_url = href
+            else:
+                link_url = urljoin(site_config['base_url'], href)
+        
+        # Se não encontrou link, usa o site base
+        if not link_url:
+            link_url = site_config['base_url']
+        
+        return Listing(site_name.replace('_', ' ').title(), title, price, address, link_url,
+                       is_local_site, area, bedrooms, pending_location)
+
+    def extract_embedded_page(self, site_name: str, site_config: Dict, content: bytes, offset: int) -> Optional[Dict]:
+        """Extrai os anúncios do JSON embutido na página; None se a página não tiver esse estado"""
+        records = list(iter_embedded_listings(content))
+        if not records:
+            return None
+        
+        rejected = {}
+        rows = [(position, dict(record, href=record['url'])) for position, record in enumerate(records)]
+        listings = self.filter_listings(site_name, site_config, offset, rows, rejected)
+        
+        logging.info(f"⚡ {site_name}: {len(records)} imóveis lidos do JSON embutido")
+        return {
+            'cards': len(records),
+            'signature': records[0]['url'] or records[0]['title'],
+            'next_url': None,
+            'listings': listings,
+            'rejected': rejected
+        }
+
+    def build_strainer(self, selectors_string: str) -> Optional['bs4.SoupStrainer']:
+        """Converte seletores simples ('.classe', '[attr="valor"]') em um SoupStrainer
+        
+        Só é possível quando todos os seletores usam o mesmo atributo; caso contrário
+        retorna None e a página é parseada por inteiro.
+        """
+        if selectors_string in self._strainers:
+            return self._strainers[selectors_string]
+        
+        attr_name = None
+        values = []
+        for selector in selectors_string.split(', '):
+            selector = selector.strip()
+            class_match = re.fullmatch(r'\.([\w-]+)', selector)
+            attr_match = re.fullmatch(r'\[([\w-]+)="([^"]*)"\]', selector)
+            if class_match:
+                name, value = 'class', class_match.group(1)
+            elif attr_match:
+                name, value = attr_match.group(1), attr_match.group(2)
+            else:
+                name = None
             
-            if not properties:
-                logging.info(f"⚠️ {site_name}: Nenhuma propriedade encontrada - site pode ter mudado estrutura")
-                return results
+            if name is None or (attr_name is not None and name != attr_name):
+                self._strainers[selectors_string] = None
+                return None
+            attr_name = name
+            values.append(re.escape(value))
+        
+        # 'class' chega ao strainer como texto bruto ("a b c"), por isso o regex por palavra
+        if attr_name == 'class':
+            pattern = re.compile(r'(^|\s)(' + '|'.join(values) + r')(\s|$)')
+        else:
+            pattern = re.compile(r'^(' + '|'.join(values) + r')$')
+        strainer = bs4.SoupStrainer(attrs={attr_name: pattern})
+        self._strainers[selectors_string] = strainer
+        return strainer
+
+    def make_soup(self, site_config: Dict, content: bytes, restrict: bool = True):
+        """Cria o BeautifulSoup com o parser configurado, opcionalmente só com os cards de imóveis"""
+        parser = site_config.get('parser', self.parser)
+        
+        # Sites com link de "próxima página" precisam do documento inteiro
+        strainer = None
+        if restrict and 'next' not in site_config.get('pagination', {}):
+            strainer = self.build_strainer(site_config['selectors']['property'])
+        
+        return bs4.BeautifulSoup(content, parser, parse_only=strainer), strainer is not None
+
+    def parse_fingerprint(self, site_config: Dict, offset: int) -> str:
+        """Identifica os critérios usados no parse, para saber se um parse em cache ainda vale"""
+        criteria = [site_config['selectors'], site_config.get('embedded_json', False),
+                    self.min_price, self.max_price, self.target_neighborhoods, self.enrich_details, offset]
+        return hashlib.sha1(json.dumps(criteria, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def parse_page(self, site_name: str, site_config: Dict, url: str, response, offset: int) -> Dict:
+        """Extrai os imóveis de uma página; páginas não modificadas reutilizam o parse anterior"""
+        fingerprint = self.parse_fingerprint(site_config, offset)
+        if self.cache and getattr(response, 'not_modified', False):
+            parsed = response.meta.get('parsed')
+            if parsed and parsed['fingerprint'] == fingerprint:
+                logging.info(f"💾 {site_name}: Página sem alterações - parse ignorado")
+                self.metrics.count(site_name, 'parse_cache_hits')
+                return dict(parsed['data'], listings=[
+                    (position, Listing.from_dict(record)) for position, record in parsed['data']['listings']])
+        
+        if self.parse_workers > 0:
+            page_data = self.parse_in_pool(site_name, site_config, response.content, response.url, offset)
+        else:
+            page_data = self.parse_content(site_name, site_config, response.content, response.url, offset)
+        self.record_learning(site_name, page_data.pop('learning', None))
+        if self.cache:
+            self.cache.store_parsed(url, fingerprint, dict(page_data, listings=[
+                (position, listing.to_dict()) for position, listing in page_data['listings']]))
+        return page_data
+
+    def parse_in_pool(self, site_name: str, site_config: Dict, content: bytes, page_url: str, offset: int) -> Dict:
+        """Envia o parse da página para o pool de processos e espera o resultado
+        
+        Só os bytes da resposta, o site e os critérios atravessam o processo; os
+        tempos medidos no worker são somados às métricas deste processo.
+        """
+        pool = self.parse_pool
+        waiting = time.perf_counter()
+        with self._parse_slots:
+            self.metrics.observe(site_name, 'parse_queue_wait', time.perf_counter() - waiting)
+            future = pool.submit(parse_page_worker, self.parse_settings(), site_name, site_config,
+                                 content, page_url, offset, self.learned_selector(site_name))
+            page_data, worker_metrics = future.result()
+        self.metrics.merge(site_name, worker_metrics)
+        return page_data
+
+    def parse_content(self, site_name: str, site_config: Dict, content: bytes, page_url: str, offset: int) -> Dict:
+        """Parse e extração dos cards a partir dos bytes da página (roda também nos workers de parse)"""
+        # Portais que renderizam a partir de JSON: lê os dados estruturados direto dos <script>
+        if site_config.get('embedded_json'):
+            started = time.perf_counter()
+            page_data = self.extract_embedded_page(site_name, site_config, content, offset)
+            self.metrics.observe(site_name, 'embedded_json', time.perf_counter() - started)
+            if page_data is not None:
+                return page_data
+        
+        # Com um seletor aprendido, os seletores configurados já falharam: parse completo direto
+        timer = time.perf_counter()
+        soup, restricted = self.make_soup(site_config, content, restrict=not self.learned_selector(site_name))
+        parse_seconds = time.perf_counter() - timer
+        timer = time.perf_counter()
+        learning = {}
+        properties = self.find_properties(site_name, site_config, soup, learning)
+        select_seconds = time.perf_counter() - timer
+        if not properties and restricted:
+            # Os seletores configurados falharam: parse completo para os seletores de fallback
+            timer = time.perf_counter()
+            soup, _ = self.make_soup(site_config, content, restrict=False)
+            parse_seconds += time.perf_counter() - timer
+            timer = time.perf_counter()
+            properties = self.find_properties(site_name, site_config, soup, learning)
+            select_seconds += time.perf_counter() - timer
+        self.metrics.observe(site_name, 'parse', parse_seconds)
+        self.metrics.observe(site_name, 'select', select_seconds)
+        
+        # Extrai os campos de todos os cards e filtra a página inteira de uma vez
+        extracting = time.perf_counter()
+        rejected = {}
+        rows = self.extract_rows(site_name, site_config, properties, offset, rejected)
+        listings = self.filter_listings(site_name, site_config, offset, rows, rejected)
+        self.metrics.observe(site_name, 'extract', time.perf_counter() - extracting)
+        
+        return {
+            'cards': len(properties),
+            'signature': properties[0].get_text(strip=True)[:200] if properties else '',
+            'next_url': self.find_next_page_url(soup, site_config, page_url),
+            'listings': listings,
+            'rejected': rejected,
+            'learning': learning
+        }
+
+    def scrape_site(self, site_name: str, site_config: Dict) -> Iterator[Listing]:
+        """Faz scraping de um site, percorrendo as páginas de resultados até o limite configurado
+        
+        É um gerador: cada imóvel aceito é entregue assim que sua página é processada.
+        """
+        max_pages = site_config.get('max_pages', self.max_pages)
+        max_listings = site_config.get('max_listings', self.max_listings_per_site)
+        cards_seen = 0
+        previous_signature = None
+        
+        # Um worker dedicado baixa a próxima página enquanto a atual é processada
+        prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{site_name}-page')
+        try:
+            logging.info(f"Buscando em {site_name}...")
             
-            logging.info(f"📊 {site_name}: Processando {len(properties)} propriedades...")
+            page = 1
+            url = site_config['search_url']
+            pending = (url, prefetcher.submit(self.fetch_page, site_name, site_config, url))
             
-            for i, prop in enumerate(properties[:10]):  # Reduzido para 10 por site
-                try:
-                    # Tenta múltiplos seletores para cada campo
-                    title = self.extract_text_multi_selectors(prop, site_config['selectors']['title'])
-                    price_text = self.extract_text_multi_selectors(prop, site_config['selectors']['price'])
-                    address = self.extract_text_multi_selectors(prop, site_config['selectors']['address'])
-                    
-                    # Se não conseguiu extrair título, tenta alternativas
-                    if not title:
-                        title = self.extract_text_multi_selectors(prop, 'h1, h2, h3, h4, .title, .titulo, .nome, [title]')
-                    
-                    # Se não conseguiu extrair preço, tenta alternativas
-                    if not price_text:
-                        price_text = self.extract_text_multi_selectors(prop, '.valor, .price, .preco, [class*="price"], [class*="preco"], [class*="valor"]')
-                    
-                    # Se não conseguiu extrair endereço, tenta alternativas
-                    if not address:
-                        address = self.extract_text_multi_selectors(prop, '.local, .localizacao, .endereco, .address, [class*="endereco"], [class*="address"], [class*="local"]')
-                    
-                    # Valores padrão se não encontrou
-                    title = title or f'Casa {i+1} - {site_name.replace("_", " ").title()}'
-                    price_text = price_text or '0'
-                    address = address or 'São João del Rei, MG'
-                    
-                    # Processa preço
-                    price = self.clean_price(price_text)
-                    
-                    # Verifica se atende aos critérios
-                    if price and price <= self.max_price and price > 50000:  # Preço mínimo para evitar erros
-                        # Para sites nacionais, verifica localização; para locais, assume que são da região
-                        is_local_site = site_name not in ['vivareal', 'zapimoveis', 'olx']
-                        location_ok = is_local_site or self.is_target_neighborhood(address)
-                        
-                        if location_ok:
-                            # Constrói URL do imóvel
-                            link_url = ''
-                            link_selectors = site_config['selectors']['link'].split(', ')
-                            for link_sel in link_selectors:
-                                link_elem = prop.select_one(link_sel.strip())
-                                if link_elem and link_elem.get('href'):
-                                    href = link_elem.get('href')
-                                    if href.startswith('http'):
-                                        link_url = href
-                                    else:
-                                        link_url = urljoin(site_config['base_url'], href)
-                                    break
-                            
-                            # Se não encontrou link, usa o site base
-                            if not link_url:
-                                link_url = site_config['base_url']
-                            
-                            property_data = {
-                                'site': site_name.replace('_', ' ').title(),
-                                'title': title,
-                                'price': price,
-                                'price_formatted': f"R$ {price:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
-                                'address': address,
-                                'url': link_url,
-                                'is_local': is_local_site
-                            }
-                            
-                            results.append(property_data)
-                            logging.info(f"✅ {site_name}: {title} - {property_data['price_formatted']}")
+            while pending is not None:
+                url, future = pending
+                response = future.result()
+                pending = None
+                if response is None:
+                    break
                 
-                except Exception as e:
-                    logging.debug(f"Erro ao processar propriedade {i+1} de {site_name}: {e}")
-                    continue
+                # Dispara o download da próxima página antes de parsear a atual
+                next_url = self.build_page_url(site_config, page + 1) if page < max_pages else None
+                if next_url:
+                    pending = (next_url, prefetcher.submit(self.fetch_page, site_name, site_config, next_url))
+                
+                page_data = self.parse_page(site_name, site_config, url, response, cards_seen)
+                
+                if not page_data['cards']:
+                    if page == 1:
+                        logging.info(f"⚠️ {site_name}: Nenhuma propriedade encontrada - site pode ter mudado estrutura")
+                    break
+                
+                # Alguns sites ignoram o parâmetro de página e repetem a primeira
+                if page_data['signature'] == previous_signature:
+                    logging.info(f"🔁 {site_name}: Página {page} repete a anterior - fim da paginação")
+                    break
+                previous_signature = page_data['signature']
+                
+                remaining = max_listings - cards_seen
+                logging.info(f"📊 {site_name}: Processando {min(page_data['cards'], remaining)} propriedades (página {page})...")
+                self.metrics.count(site_name, 'pages')
+                self.metrics.count(site_name, 'cards_seen', min(page_data['cards'], remaining))
+                for reason, amount in page_data.get('rejected', {}).items():
+                    self.metrics.count(site_name, f'rejected_{reason}', amount)
+                
+                for position, property_data in page_data['listings']:
+                    if position < remaining:
+                        logging.info(f"✅ {site_name}: {property_data['title']} - {property_data['price_formatted']}")
+                        self.metrics.count(site_name, 'accepted')
+                        yield property_data
+                cards_seen += min(page_data['cards'], remaining)
+                
+                if cards_seen >= max_listings:
+                    logging.info(f"🛑 {site_name}: Limite de {max_listings} anúncios atingido")
+                    break
+                
+                # Sites sem parâmetro de página: segue o link "próxima" encontrado no HTML
+                if page < max_pages and pending is None and page_data['next_url']:
+                    next_url = page_data['next_url']
+                    pending = (next_url, prefetcher.submit(self.fetch_page, site_name, site_config, next_url))
+                
+                page += 1
                     
         except requests.exceptions.Timeout:
             logging.warning(f"⏰ {site_name}: Timeout - site muito lento")
@@ -351,18 +2694,23 @@ class HouseFinder:
             logging.warning(f"❌ {site_name}: Erro de requisição: {e}")
         except Exception as e:
             logging.error(f"💥 {site_name}: Erro inesperado: {e}")
-        
-        return results
+        finally:
+            # Descarta a página pré-carregada que não será mais usada
+            prefetcher.shutdown(wait=False, cancel_futures=True)
 
     def extract_text_multi_selectors(self, element, selectors_string: str) -> str:
         """Tenta extrair texto usando múltiplos seletores"""
         if not selectors_string:
             return ''
         
-        selectors = selectors_string.split(', ')
+        selectors = self._compiled_selectors.get(selectors_string)
+        if selectors is None:
+            selectors = [sv.compile(sel.strip()) for sel in selectors_string.split(', ')]
+            self._compiled_selectors[selectors_string] = selectors
+        
         for selector in selectors:
             try:
-                elem = element.select_one(selector.strip())
+                elem = selector.select_one(element)
                 if elem:
                     text = elem.get_text(strip=True)
                     if text:
@@ -371,40 +2719,182 @@ class HouseFinder:
                 continue
         return ''
 
-    def search_all_sites(self) -> List[Dict]:
-        """Busca em todos os sites configurados"""
-        all_results = []
+    def collect_site(self, site_name: str, site_config: Dict, sink: Optional['ListingSink'] = None) -> List[Listing]:
+        """Consome o gerador do site, gravando cada imóvel no sink assim que chega"""
+        started = time.perf_counter()
+        site_results = []
+        for property_data in self.scrape_site(site_name, site_config):
+            if sink:
+                sink.write(property_data)
+            site_results.append(property_data)
+        self.metrics.observe(site_name, 'total', time.perf_counter() - started)
+        return site_results
+
+    def stream_site(self, site_name: str, site_config: Dict, sink: 'ListingSink') -> int:
+        """Como collect_site, mas os imóveis só vão para o sink: nada fica em memória"""
+        started = time.perf_counter()
+        count = 0
+        for property_data in self.scrape_site(site_name, site_config):
+            sink.write(property_data)
+            count += 1
+        self.metrics.observe(site_name, 'total', time.perf_counter() - started)
+        return count
+
+    def active_sites(self) -> List[tuple]:
+        """Sites ativos e saudáveis, locais primeiro e depois os nacionais"""
         local_sites = []
         national_sites = []
         
-        # Separa sites locais dos nacionais
+        # Separa sites locais dos nacionais (apenas ativos)
         for site_name, site_config in self.sites.items():
+            if not site_config.get('active', True):  # Pula sites desabilitados
+                logging.info(f"⏭️ Pulando {site_name} (desabilitado)")
+                continue
+            if self.site_health and self.site_health.should_skip(site_name):
+                logging.info(f"⏸️ Pulando {site_name} (falhas seguidas: {self.site_health.describe(site_name)})")
+                continue
+                
             if site_name in ['vivareal', 'zapimoveis', 'olx']:
                 national_sites.append((site_name, site_config))
             else:
                 local_sites.append((site_name, site_config))
+        return local_sites + national_sites
+
+    def for_each_site(self, search: Callable[[str, Dict], object]) -> List:
+        """Executa search(site_name, site_config) em todos os sites ativos e saudáveis
         
-        # Busca primeiro nas imobiliárias locais
-        logging.info("🏢 Iniciando busca nas IMOBILIÁRIAS LOCAIS de São João del Rei...")
-        for site_name, site_config in local_sites:
-            site_results = self.scrape_site(site_name, site_config)
-            all_results.extend(site_results)
-            # Pausa mais longa para sites locais (mais sensíveis)
-            time.sleep(3)
+        Retorna os resultados na ordem dos sites (locais primeiro, depois nacionais).
+        """
+        sites = self.active_sites()
+        if not sites:
+            logging.info("ℹ️ Nenhum site ativo para buscar")
+            return []
         
-        logging.info(f"📊 Encontrados {len(all_results)} imóveis nas imobiliárias locais")
+        if self.max_workers <= 1:
+            # Modo sequencial: o HostRateLimiter cuida das pausas por host
+            logging.info("🏢 Iniciando busca sequencial em São João del Rei...")
+            site_results = [search(site_name, site_config) for site_name, site_config in sites]
+        else:
+            # Hosts diferentes são buscados em paralelo; o tempo total fica próximo ao do site mais lento
+            workers = min(self.max_workers, len(sites))
+            logging.info(f"🚀 Buscando em {len(sites)} sites em paralelo ({workers} workers)...")
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='site') as executor:
+                # executor.map preserva a ordem: locais primeiro, depois nacionais
+                site_results = list(executor.map(lambda site: search(site[0], site[1]), sites))
         
-        # Depois busca nos portais nacionais
-        logging.info("🌐 Buscando nos PORTAIS NACIONAIS...")
-        for site_name, site_config in national_sites:
-            site_results = self.scrape_site(site_name, site_config)
+        if self.site_health:
+            self.site_health.save()
+        return site_results
+
+    def search_all_sites(self) -> List[Listing]:
+        """Busca em todos os sites configurados (apenas sites ativos e saudáveis)"""
+        all_results = []
+        for site_results in self.for_each_site(self.collect_site):
             all_results.extend(site_results)
-            # Pausa menor para portais nacionais
-            time.sleep(2)
-        
+        logging.info(f"📊 Encontrados {len(all_results)} imóveis")
         return all_results
 
-    def save_results(self, results: List[Dict], filename: str = 'casas_sjdr'):
+    def stream_all_sites(self, sink: 'ListingSink') -> int:
+        """Busca em todos os sites gravando cada imóvel aceito no sink no momento em que é encontrado
+        
+        Nenhum imóvel fica em memória durante a busca (releia com sink.read()); uma
+        execução interrompida mantém a saída parcial. Retorna o total gravado.
+        """
+        total = sum(self.for_each_site(lambda site_name, site_config: self.stream_site(site_name, site_config, sink)))
+        logging.info(f"📊 Encontrados {total} imóveis")
+        return total
+
+    def parse_detail_page(self, site_config: Dict, content: bytes) -> Dict:
+        """Extrai endereço completo, área e quartos da página de detalhe de um anúncio"""
+        details = {'address': '', 'area': None, 'bedrooms': None}
+        
+        # O anúncio principal costuma ser o primeiro objeto do JSON embutido
+        record = next(iter_embedded_listings(content), None)
+        if record:
+            details['address'] = record['address']
+            details['area'] = record['area']
+            details['bedrooms'] = record['bedrooms']
+        if details['address'] and details['area'] is not None and details['bedrooms'] is not None:
+            return details
+        
+        soup = bs4.BeautifulSoup(content, site_config.get('parser', self.parser))
+        selectors = dict(DETAIL_SELECTORS, **site_config.get('detail_selectors', {}))
+        if not details['address']:
+            details['address'] = self.extract_text_multi_selectors(soup, selectors['address'])
+        
+        page_text = None
+        if details['area'] is None:
+            area_text = self.extract_text_multi_selectors(soup, selectors['area'])
+            page_text = soup.get_text(' ', strip=True)
+            area_match = AREA_RE.search(area_text) or AREA_RE.search(page_text)
+            if area_match:
+                details['area'] = float(area_match.group(1).replace('.', '').replace(',', '.'))
+        if details['bedrooms'] is None:
+            bedrooms_text = self.extract_text_multi_selectors(soup, selectors['bedrooms'])
+            bedrooms_match = BEDROOMS_RE.search(bedrooms_text) or BEDROOMS_RE.search(page_text or soup.get_text(' ', strip=True))
+            if bedrooms_match:
+                details['bedrooms'] = int(bedrooms_match.group(1))
+        return details
+
+    def fetch_details(self, site_name: str, site_config: Dict, url: str) -> Optional[Dict]:
+        """Baixa e interpreta a página de detalhe (usa o cache de detalhes quando possível)"""
+        cached = self.detail_cache.get(url) if self.detail_cache else None
+        if cached:
+            return cached
+        
+        try:
+            response = self.fetch_page(site_name, site_config, url, record_health=False)
+        except requests.exceptions.RequestException as e:
+            logging.debug(f"Erro ao buscar detalhes de {url}: {e}")
+            return None
+        if response is None:
+            return None
+        
+        details = self.parse_detail_page(site_config, response.content)
+        if self.detail_cache:
+            self.detail_cache.put(url, details)
+        return details
+
+    def enrich_listings(self, results: List[Listing]) -> List[Listing]:
+        """Completa os anúncios com os dados da página de detalhe e refaz o filtro de bairro"""
+        sites_by_label = {name.replace('_', ' ').title(): (name, config) for name, config in self.sites.items()}
+        jobs = []
+        for listing in results:
+            site_name, site_config = sites_by_label.get(listing['site'], (None, None))
+            # Sem link próprio (só a página do site) não há detalhe a buscar
+            if site_config and urlparse(listing['url']).path not in ('', '/'):
+                jobs.append((listing, site_name, site_config))
+        
+        logging.info(f"🔎 Enriquecendo {len(jobs)} anúncios com as páginas de detalhe ({self.enrichment_workers} workers)...")
+        with ThreadPoolExecutor(max_workers=self.enrichment_workers, thread_name_prefix='detail') as executor:
+            futures = [
+                (listing, executor.submit(self.fetch_details, site_name, site_config, listing['url']))
+                for listing, site_name, site_config in jobs
+            ]
+            for listing, future in futures:
+                details = future.result()
+                if not details:
+                    continue
+                if details.get('address') and not self.is_vague_address(details['address']):
+                    listing['address'] = details['address']
+                if listing.get('area') is None:
+                    listing['area'] = details.get('area')
+                if listing.get('bedrooms') is None:
+                    listing['bedrooms'] = details.get('bedrooms')
+        
+        if self.detail_cache:
+            self.detail_cache.save()
+        
+        # Com o endereço completo, o filtro de bairro dos portais nacionais é refeito
+        enriched = []
+        for listing in results:
+            listing.pending_location = False
+            if listing.is_local or self.is_target_neighborhood(listing.address):
+                enriched.append(listing)
+        logging.info(f"📍 {len(enriched)} de {len(results)} anúncios nos bairros alvo após o enriquecimento")
+        return enriched
+
+    def save_results(self, results: List[Listing], filename: str = 'casas_sjdr'):
         """Salva os resultados em diferentes formatos"""
         if not results:
             logging.info("Nenhum resultado encontrado para salvar.")
@@ -412,128 +2902,98 @@ class HouseFinder:
         
         # Salva em JSON
         with open(f'{filename}.json', 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+            json.dump([result.to_dict() for result in results], f, ensure_ascii=False, indent=2)
         
-        # Salva em CSV
-        df = pd.DataFrame(results)
-        df.to_csv(f'{filename}.csv', index=False, encoding='utf-8')
+        # Salva em CSV (colunas na ordem em que os campos aparecem)
+        fieldnames = list(dict.fromkeys(key for result in results for key in result.keys()))
+        with open(f'{filename}.csv', 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(results)
         
-        # Salva em HTML (relatório visual)
-        html_content = self.generate_html_report(results)
+        # Salva em HTML (relatório visual), escrito direto no arquivo conforme é renderizado
         with open(f'{filename}.html', 'w', encoding='utf-8') as f:
-            f.write(html_content)
+            self.write_html_report(results, f)
         
         logging.info(f"Resultados salvos em {filename}.json, {filename}.csv e {filename}.html")
 
-    def generate_html_report(self, results: List[Dict]) -> str:
-        """Gera relatório HTML dos resultados"""
-        local_results = [r for r in results if r.get('is_local', False)]
-        national_results = [r for r in results if not r.get('is_local', False)]
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html lang="pt-BR">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Casas Encontradas - São João del Rei</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; background-color: #f5f5f5; }}
-                .header {{ background: linear-gradient(135deg, #2c3e50, #3498db); color: white; padding: 20px; border-radius: 10px; margin-bottom: 20px; }}
-                .stats {{ display: flex; justify-content: space-around; margin: 20px 0; }}
-                .stat-box {{ background: white; padding: 15px; border-radius: 8px; text-align: center; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-                .section-title {{ background-color: #34495e; color: white; padding: 15px; border-radius: 5px; margin: 20px 0 10px 0; }}
-                .property {{ border: 1px solid #ddd; margin: 10px 0; padding: 15px; border-radius: 8px; background: white; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-                .property.local {{ border-left: 5px solid #e74c3c; }}
-                .property.national {{ border-left: 5px solid #3498db; }}
-                .price {{ color: #27ae60; font-weight: bold; font-size: 18px; }}
-                .site {{ padding: 5px 10px; border-radius: 3px; font-size: 12px; color: white; display: inline-block; margin-bottom: 5px; }}
-                .site.local {{ background-color: #e74c3c; }}
-                .site.national {{ background-color: #3498db; }}
-                .address {{ color: #7f8c8d; margin: 5px 0; }}
-                a {{ color: #2980b9; text-decoration: none; }}
-                a:hover {{ text-decoration: underline; }}
-                .no-results {{ text-align: center; color: #7f8c8d; padding: 40px; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>🏠 Casas Encontradas - São João del Rei</h1>
-                <p>Centro e Bairro Segredo - Até R$ 350.000</p>
-            </div>
-            
-            <div class="stats">
-                <div class="stat-box">
-                    <h3>{len(results)}</h3>
-                    <p>Total de Imóveis</p>
-                </div>
-                <div class="stat-box">
-                    <h3>{len(local_results)}</h3>
-                    <p>Imobiliárias Locais</p>
-                </div>
-                <div class="stat-box">
-                    <h3>{len(national_results)}</h3>
-                    <p>Portais Nacionais</p>
-                </div>
-                <div class="stat-box">
-                    <h3>R$ {min([r['price'] for r in results]):,.0f}</h3>
-                    <p>Menor Preço</p>
-                </div>
-            </div>
+    def generate_html_report(self, results: List[Listing]) -> str:
+        """Gera relatório HTML dos resultados (em memória; save_results escreve direto no arquivo)"""
+        buffer = io.StringIO()
+        self.write_html_report(results, buffer)
+        return buffer.getvalue()
+
+    def write_html_report(self, results: List[Listing], out):
+        """Escreve o relatório HTML em out (arquivo ou StringIO) numa única passada pelos imóveis
+        
+        Os imóveis são ordenados uma vez (locais primeiro, depois por preço) e cada card
+        é escrito assim que renderizado. Acima de report_paged_threshold imóveis, os dados
+        vão como JSON e o navegador monta report_page_size cards por vez.
         """
+        ordered = sorted(results, key=lambda r: (not r.is_local, r.price))
+        local_count = sum(1 for r in ordered if r.is_local)
+        # Cada metade já está ordenada por preço: o menor é o primeiro de uma delas
+        first_prices = [ordered[i].price for i in {0, local_count} if i < len(ordered)]
+        neighborhoods = ', '.join(n.title() for n in self.target_neighborhoods) or 'Todos os bairros'
         
-        if local_results:
-            html += f"""
-            <div class="section-title">
-                🏢 IMOBILIÁRIAS LOCAIS DE SÃO JOÃO DEL REI ({len(local_results)} imóveis)
-            </div>
-            """
-            for prop in sorted(local_results, key=lambda x: x['price']):
-                html += f"""
-                <div class="property local">
-                    <span class="site local">{prop['site'].upper()}</span>
-                    <h3>{prop['title']}</h3>
-                    <div class="price">{prop['price_formatted']}</div>
-                    <div class="address">📍 {prop['address']}</div>
-                    {f'<a href="{prop["url"]}" target="_blank">🔗 Ver no site da imobiliária</a>' if prop['url'] else ''}
-                </div>
-                """
-        
-        if national_results:
-            html += f"""
-            <div class="section-title">
-                🌐 PORTAIS NACIONAIS ({len(national_results)} imóveis)
-            </div>
-            """
-            for prop in sorted(national_results, key=lambda x: x['price']):
-                html += f"""
-                <div class="property national">
-                    <span class="site national">{prop['site'].upper()}</span>
-                    <h3>{prop['title']}</h3>
-                    <div class="price">{prop['price_formatted']}</div>
-                    <div class="address">📍 {prop['address']}</div>
-                    {f'<a href="{prop["url"]}" target="_blank">🔗 Ver detalhes</a>' if prop['url'] else ''}
-                </div>
-                """
+        write = out.write
+        max_price = f"{self.max_price:,.0f}".replace(',', '.')
+        write(REPORT_HEAD.render(
+            city=html.escape(self.city.title()),
+            criteria=html.escape(f"{neighborhoods} - Até R$ {max_price}"),
+            total=len(ordered),
+            local_count=local_count,
+            national_count=len(ordered) - local_count,
+            min_price=f"R$ {min(first_prices):,.0f}" if first_prices else '-'
+        ))
         
-        if not results:
-            html += """
-            <div class="no-results">
-                <h3>❌ Nenhum imóvel encontrado</h3>
-                <p>Tente ajustar os critérios de busca ou verificar novamente mais tarde.</p>
-            </div>
-            """
-        
-        html += """
-        </body>
-        </html>
-        """
-        return html
+        if not ordered:
+            write(REPORT_EMPTY)
+        elif len(ordered) > self.report_paged_threshold:
+            write('    <script id="listing-data" type="application/json">[')
+            fields = ('site', 'title', 'price_formatted', 'address', 'url', 'is_local')
+            # Em blocos: o encoder JSON trabalha em C sem montar o documento inteiro na memória
+            for start in range(0, len(ordered), 500):
+                chunk = [{field: getattr(prop, field) for field in fields} for prop in ordered[start:start + 500]]
+                # '</' dentro do JSON fecharia o <script> antes da hora
+                write((',' if start else '') + json.dumps(chunk, ensure_ascii=False)[1:-1].replace('</', '<\\/'))
+            write(']</script>\n')
+            write(REPORT_PAGED_SCRIPT.render(page_size=self.report_page_size))
+        else:
+            sections = (
+                (f'🏢 IMOBILIÁRIAS LOCAIS DE {self.city.upper()}', 'local', 0, local_count, 'Ver no site da imobiliária'),
+                ('🌐 PORTAIS NACIONAIS', 'national', local_count, len(ordered), 'Ver detalhes'),
+            )
+            render_card = REPORT_CARD.render
+            escape = html.escape
+            site_labels = {}  # Poucos sites distintos: o nome escapado é reaproveitado
+            for title, kind, start, end, link_text in sections:
+                if start == end:
+                    continue
+                write(REPORT_SECTION.render(title=html.escape(title), count=end - start))
+                for position in range(start, end):
+                    prop = ordered[position]
+                    site = site_labels.get(prop.site)
+                    if site is None:
+                        site = site_labels[prop.site] = escape(prop.site.upper())
+                    url = prop.url
+                    write(render_card(
+                        kind=kind,
+                        site=site,
+                        title=escape(str(prop.title)),
+                        price=prop.price_formatted,  # format_brl: só dígitos, separadores e 'R$'
+                        address=escape(str(prop.address)),
+                        link=f'<a href="{escape(url)}" target="_blank">🔗 {link_text}</a>' if url else ''
+                    ))
+        
+        write(REPORT_TAIL)
 
     def enable_site(self, site_name: str):
         """Habilita um site específico para teste"""
         if site_name in self.sites:
             self.sites[site_name]['active'] = True
+            if self.site_health:
+                self.site_health.reset(site_name)
             logging.info(f"✅ Site {site_name} habilitado")
         else:
             logging.warning(f"⚠️ Site {site_name} não encontrado")
@@ -551,39 +3011,78 @@ class HouseFinder:
         logging.info("📋 STATUS DOS SITES:")
         for site_name, config in self.sites.items():
             status = "✅ ATIVO" if config.get('active', True) else "❌ INATIVO"
-            logging.info(f"  {site_name}: {status}")
+            if self.site_health and config.get('active', True) and self.site_health.should_skip(site_name):
+                status = "⏸️ SUSPENSO"
+            health = f" ({self.site_health.describe(site_name)})" if self.site_health else ''
+            logging.info(f"  {site_name}: {status}{health}")
 
-    def run(self):
-        """Executa a busca completa com tratamento de erros melhorado"""
+    def run(self, incremental: bool = False):
+        """Executa a busca completa com tratamento de erros melhorado
+        
+        Em modo incremental só os anúncios novos ou com preço alterado desde a
+        última execução são salvos e exibidos.
+        """
         logging.info("🏠 Iniciando busca de casas em São João del Rei...")
         logging.info(f"Critérios: Centro e Bairro Segredo, até R$ {self.max_price:,.2f}")
         
         # Mostra status dos sites
         self.list_sites_status()
         
-        results = self.search_all_sites()
+        # Cada execução grava as próprias métricas
+        self.metrics = RunMetrics()
+        try:
+            self.run_search(incremental)
+        finally:
+            self.close_parse_pool()
+            self.record_connection_stats()
+            self.metrics.save(prometheus=self.prometheus_output)
+            logging.info(f"📈 Métricas salvas em casas_sjdr_metricas.json{' e .prom' if self.prometheus_output else ''}")
+
+    def run_search(self, incremental: bool = False):
+        """Busca, deduplica, salva e exibe os resultados (etapas medidas em self.metrics)"""
+        started = time.perf_counter()
+        # Saída parcial gravada durante a busca, antes de deduplicar; os imóveis
+        # são relidos do disco e só os únicos (após a deduplicação) ficam em memória
+        if self.stream_output:
+            with ListingSink() as sink:
+                found = self.stream_all_sites(sink)
+            logging.info(f"💾 {sink.count} imóveis gravados em {sink.filename}.jsonl e {sink.filename}.csv durante a busca")
+            # Locais primeiro, como na busca sem streaming: a deduplicação mantém o primeiro
+            results = itertools.chain(sink.read(local=True), sink.read(local=False))
+        else:
+            results = self.search_all_sites()
+            found = len(results)
+        self.metrics.observe(None, 'search', time.perf_counter() - started)
         
-        if results:
-            logging.info(f"✅ Encontradas {len(results)} propriedades que atendem aos critérios!")
-            
-            # Remove duplicatas baseado na URL
-            unique_results = []
-            seen_urls = set()
-            seen_titles = set()
+        if found and self.enrich_details:
+            started = time.perf_counter()
+            results = self.enrich_listings(list(results))
+            found = len(results)
+            self.metrics.observe(None, 'enrich', time.perf_counter() - started)
+        
+        if found:
+            logging.info(f"✅ Encontradas {found} propriedades que atendem aos critérios!")
             
-            for result in results:
-                # Remove duplicatas por URL ou título similar
-                url_key = result['url'] if result['url'] else f"no-url-{len(unique_results)}"
-                title_key = result['title'].lower()
-                
-                if url_key not in seen_urls and title_key not in seen_titles:
-                    unique_results.append(result)
-                    seen_urls.add(url_key)
-                    seen_titles.add(title_key)
+            # Remove duplicatas: mesma URL ou mesmo imóvel anunciado em portais diferentes
+            started = time.perf_counter()
+            unique_results = self.deduplicator.deduplicate(results)
+            self.metrics.observe(None, 'dedup', time.perf_counter() - started)
+            self.metrics.count(None, 'listings', found)
+            self.metrics.count(None, 'unique_listings', len(unique_results))
             
             logging.info(f"📊 {len(unique_results)} propriedades únicas após remoção de duplicatas")
             
-            self.save_results(unique_results)
+            changes = self.store.record(unique_results) if self.store else []
+            if incremental:
+                new_count = sum(1 for change in changes if change['status'] == 'new')
+                logging.info(f"🆕 {new_count} novos e {len(changes) - new_count} com preço alterado desde a última execução")
+                if not changes:
+                    print("\n✅ Nenhuma novidade desde a última execução")
+                    return
+                unique_results = changes
+                self.save_results(unique_results, filename='casas_sjdr_novidades')
+            else:
+                self.save_results(unique_results)
             
             # Exibe resumo melhorado
             print("\n" + "="*70)
@@ -594,9 +3093,10 @@ class HouseFinder:
             print(f"🏘️ Imóveis encontrados: {len(unique_results)}")
             
             if unique_results:
-                min_price = min(r['price'] for r in unique_results)
-                max_price = max(r['price'] for r in unique_results)
-                avg_price = sum(r['price'] for r in unique_results) / len(unique_results)
+                prices = Listing.columns(unique_results, ('price',))['price']
+                min_price = min(prices)
+                max_price = max(prices)
+                avg_price = sum(prices) / len(prices)
                 
                 print(f"💵 Menor preço: R$ {min_price:,.2f}")
                 print(f"💰 Maior preço: R$ {max_price:,.2f}")
@@ -604,8 +3104,7 @@ class HouseFinder:
                 
                 # Agrupa por site
                 sites_count = {}
-                for result in unique_results:
-                    site = result['site']
+                for site in Listing.columns(unique_results, ('site',))['site']:
                     sites_count[site] = sites_count.get(site, 0) + 1
                 
                 print(f"\n🌐 Por site:")
@@ -616,8 +3115,12 @@ class HouseFinder:
             print("🏘️ IMÓVEIS ENCONTRADOS:")
             print("="*70)
             
-            for i, prop in enumerate(sorted(unique_results, key=lambda x: x['price']), 1):
+            for i, prop in enumerate(sorted(unique_results, key=attrgetter('price')), 1):
                 print(f"\n{i:2d}. {prop['title']}")
+                if prop.get('status') == 'new':
+                    print("    🆕 Novo anúncio")
+                elif prop.get('status') == 'price_changed':
+                    print(f"    💲 Preço alterado (antes: R$ {prop['previous_price']:,.2f})")
                 print(f"    💰 {prop['price_formatted']}")
                 print(f"    📍 {prop['address']}")
                 print(f"    🌐 {prop['site']}")
@@ -640,30 +3143,358 @@ class HouseFinder:
             print("• Considere aumentar o valor máximo")
             print("• Execute: finder.enable_site('olx') para tentar sites desabilitados")
 
+    def for_query(self, query: Dict) -> 'HouseFinder':
+        """Cópia do buscador para uma consulta do modo lote (cidade, bairros e faixa de preço próprios)
+        
+        Sessão, rate limiter, caches, métricas e histórico continuam compartilhados.
+        As URLs de busca saem de 'search_url_template'; sites sem template (as
+        imobiliárias locais) só entram quando a cidade é a do buscador original.
+        """
+        self.session  # Cria a sessão antes da cópia: todas as consultas usam o mesmo pool de conexões
+        if self.parse_workers > 0:
+            self.parse_pool  # Idem para o pool de processos de parse
+        finder = copy.copy(self)
+        same_city = fold_text(query['city']) == fold_text(self.city)
+        state = query.get('state', 'mg').lower()
+        fields = {'city_slug': slugify(query['city']), 'state': state, 'state_name': STATE_SLUGS.get(state, state)}
+        
+        finder.city = query['city'].lower()
+        finder.target_neighborhoods = [n.lower() for n in query.get('neighborhoods', self.target_neighborhoods if same_city else [])]
+        finder.max_price = query.get('max_price', self.max_price)
+        finder.min_price = query.get('min_price', self.min_price)
+        finder.sites = {}
+        for site_name, site_config in self.sites.items():
+            template = site_config.get('search_url_template')
+            if template:
+                finder.sites[site_name] = dict(site_config, search_url=template.format(**fields))
+            elif same_city:
+                finder.sites[site_name] = site_config
+        return finder
+
+    def run_batch(self, queries: List[Dict]):
+        """Executa várias consultas (cidades/faixas de preço) num único agendador
+        
+        Todas as buscas (consulta x site) dividem o mesmo pool de workers, a mesma
+        sessão HTTP e o mesmo rate limiter por host; uma página pedida por mais de
+        uma consulta é baixada uma vez só. Cada consulta gera seus próprios arquivos.
+        """
+        logging.info(f"🗂️ Modo lote: {len(queries)} consultas")
+        self.metrics = RunMetrics()
+        self.fetch_memo = FetchMemo()
+        finders = [self.for_query(query) for query in queries]
+        try:
+            tasks = [(index, finder, site_name, site_config)
+                     for index, finder in enumerate(finders)
+                     for site_name, site_config in finder.active_sites()]
+            results = [[] for _ in finders]
+            if tasks:
+                workers = max(1, min(self.max_workers, len(tasks)))
+                logging.info(f"🚀 Buscando {len(tasks)} combinações consulta/site ({workers} workers)...")
+                started = time.perf_counter()
+                sink = ListingSink('casas_lote_parcial') if self.stream_output else None
+                try:
+                    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+                        site_results = executor.map(lambda task: task[1].collect_site(task[2], task[3], sink), tasks)
+                        for (index, *_), site_result in zip(tasks, site_results):
+                            results[index].extend(site_result)
+                finally:
+                    if sink:
+                        sink.close()
+                self.metrics.observe(None, 'search', time.perf_counter() - started)
+            if self.site_health:
+                self.site_health.save()
+            self.metrics.count(None, 'shared_fetches', self.fetch_memo.hits)
+            logging.info(f"♻️ {self.fetch_memo.hits} downloads reaproveitados entre consultas")
+            
+            print("\n" + "="*70)
+            print("🗂️ RESUMO DO LOTE")
+            print("="*70)
+            for query, finder, query_results in zip(queries, finders, results):
+                filename = 'casas_' + slugify(query.get('name') or f"{query['city']} {finder.max_price:.0f}")
+                unique_results = finder.deduplicator.deduplicate(query_results) if query_results else []
+                if unique_results:
+                    if self.store:
+                        self.store.record(unique_results)
+                    finder.save_results(unique_results, filename=filename)
+                print(f"• {query.get('name') or query['city']}: {len(unique_results)} imóveis "
+                      f"(R$ {finder.min_price:,.0f} a R$ {finder.max_price:,.0f}) -> {filename}.*")
+        finally:
+            self.fetch_memo = None
+            self.close_parse_pool()
+            self.record_connection_stats()
+            self.metrics.save(prometheus=self.prometheus_output)
+
+    def poll_site(self, site_name: str, site_config: Dict) -> List[Listing]:
+        """Uma busca do modo --watch: retorna só os anúncios novos ou com preço alterado"""
+        results = self.collect_site(site_name, site_config)
+        if results and self.enrich_details:
+            results = self.enrich_listings(results)
+        if self.store:
+            return self.store.record(results)
+        
+        # Sem histórico em disco, a comparação fica só na memória do processo
+        changes = []
+        for listing in results:
+            key = ListingStore.listing_key(listing)
+            previous_price = self._watch_prices.get(key)
+            if previous_price is None:
+                changes.append(listing.copy(status='new', previous_price=None))
+            elif previous_price != listing.price:
+                changes.append(listing.copy(status='price_changed', previous_price=previous_price))
+            self._watch_prices[key] = listing.price
+        return changes
+
+    def watch(self, notifier: Optional[ChangeNotifier] = None, interval: Optional[float] = None,
+              max_polls: Optional[int] = None):
+        """Modo daemon: busca cada site de novo no seu intervalo e avisa só o que mudou
+        
+        O processo continua vivo entre as buscas: sessão HTTP (conexões abertas),
+        seletores compilados, cache e histórico de anúncios seguem aquecidos. Cada
+        site tem sua agenda ('watch_interval' no site ou interval); as páginas são
+        sempre revalidadas (ETag/304) em vez de servidas pelo TTL do cache.
+        Termina com Ctrl+C ou depois de max_polls buscas.
+        """
+        notifier = notifier or ChangeNotifier()
+        interval = interval or self.watch_interval
+        if self.cache:
+            self.cache.ttl = 0
+        self.metrics = RunMetrics()
+        
+        sites = [(site_name, site_config) for site_name, site_config in self.sites.items()
+                 if site_config.get('active', True)]
+        if not sites:
+            logging.info("ℹ️ Nenhum site ativo para vigiar")
+            return
+        logging.info(f"👀 Vigiando {len(sites)} sites (a cada {interval:.0f}s; alertas em {notifier.target})")
+        
+        next_poll = {site_name: time.monotonic() for site_name, _ in sites}
+        running = {}
+        polls = 0
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(sites))), thread_name_prefix='watch')
+        try:
+            while max_polls is None or polls < max_polls or running:
+                now = time.monotonic()
+                for site_name, site_config in sites:
+                    if site_name in running.values() or next_poll[site_name] > now:
+                        continue
+                    if max_polls is not None and polls + len(running) >= max_polls:
+                        break
+                    if self.site_health and self.site_health.should_skip(site_name):
+                        next_poll[site_name] = now + site_config.get('watch_interval', interval)
+                        continue
+                    running[executor.submit(self.poll_site, site_name, site_config)] = site_name
+                
+                if not running:
+                    time.sleep(max(0.0, min(next_poll.values()) - time.monotonic()))
+                    continue
+                idle = [next_poll[name] for name in next_poll if name not in running.values()]
+                if idle and (max_polls is None or polls + len(running) < max_polls):
+                    timeout = max(0.0, min(idle) - time.monotonic())
+                else:
+                    timeout = None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    site_name = running.pop(future)
+                    next_poll[site_name] = time.monotonic() + self.sites[site_name].get('watch_interval', interval)
+                    polls += 1
+                    try:
+                        changes = future.result()
+                    except Exception as e:
+                        logging.error(f"💥 {site_name}: Erro inesperado no modo watch: {e}")
+                        continue
+                    self.metrics.count(None, 'watch_polls')
+                    self.metrics.count(site_name, 'watch_changes', len(changes))
+                    if changes:
+                        logging.info(f"🔔 {site_name}: {len(changes)} novidades")
+                    notifier.notify(site_name, changes)
+                if done:
+                    if self.site_health:
+                        self.site_health.save()
+                    self.metrics.save(prometheus=self.prometheus_output)
+        except KeyboardInterrupt:
+            logging.info("👋 Modo watch encerrado")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.close_parse_pool()
+            self.record_connection_stats()
+            self.metrics.save(prometheus=self.prometheus_output)
+            logging.info(f"🔔 {notifier.sent} alertas enviados")
+
+_parse_worker_finder = None
+
+def parse_page_worker(settings: Dict, site_name: str, site_config: Dict, content: bytes,
+                      page_url: str, offset: int, learned: Optional[str] = None) -> tuple:
+    """Parse de uma página num processo do pool de parse (ver HouseFinder.parse_in_pool)
+    
+    Cada processo mantém um HouseFinder próprio (seletores compilados e strainers
+    reaproveitados entre páginas). O seletor aprendido do site vem do processo
+    principal, que também grava o que o worker descobrir (page_data['learning']).
+    Devolve os dados da página e as métricas do site.
+    """
+    global _parse_worker_finder
+    if _parse_worker_finder is None:
+        _parse_worker_finder = HouseFinder()
+        _parse_worker_finder.cache = None
+    finder = _parse_worker_finder
+    for key, value in settings.items():
+        setattr(finder, key, value)
+    finder.learned_selectors = LearnedSelectors(path=None)
+    if learned:
+        finder.learned_selectors.sites[site_name] = {'selector': learned}
+    finder.metrics = RunMetrics()
+    page_data = finder.parse_content(site_name, site_config, content, page_url, offset)
+    return page_data, finder.metrics.sites.get(site_name, {})
+
+def serve_listings(index: ListingIndex, host: str = '127.0.0.1', port: int = 8765,
+                   cors_origin: Optional[str] = None):
+    """API HTTP/JSON local sobre o histórico de anúncios (modo --serve)
+    
+    GET /listings?min_price=&max_price=&neighborhood=&site=&since=&sort=&limit=&offset=
+    GET /stats
+    GET /health
+    
+    limit vai de 1 a ListingIndex.MAX_LIMIT (maiores são reduzidos); parâmetros
+    inválidos dão 400. Sem cors_origin (--cors ORIGEM), páginas de outros sites
+    abertas no navegador não conseguem ler a API.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class ListingQueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = dict(parse_qsl(url.query))
+            try:
+                index.refresh()
+                if url.path == '/listings':
+                    body = index.query(
+                        min_price=float(params['min_price']) if params.get('min_price') else None,
+                        max_price=float(params['max_price']) if params.get('max_price') else None,
+                        neighborhood=params.get('neighborhood'),
+                        site=params.get('site'),
+                        since=params.get('since'),
+                        sort=params.get('sort', 'price'),
+                        limit=int(params.get('limit', 50)),
+                        offset=int(params.get('offset', 0))
+                    )
+                elif url.path == '/stats':
+                    body = index.stats()
+                elif url.path == '/health':
+                    body = {'status': 'ok', 'listings': len(index)}
+                else:
+                    return self.send_json(404, {'error': f'rota desconhecida: {url.path}'})
+            except ValueError as e:
+                return self.send_json(400, {'error': str(e)})
+            self.send_json(200, body)
+        
+        def send_json(self, status: int, body: Dict):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            if cors_origin:
+                self.send_header('Access-Control-Allow-Origin', cors_origin)
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, format, *args):
+            logging.debug(f"API {self.address_string()} - {format % args}")
+    
+    index.refresh()
+    server = ThreadingHTTPServer((host, port), ListingQueryHandler)
+    logging.info(f"🛰️ API de consulta em http://{host}:{port}/listings (histórico: {index.store.path})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("👋 API encerrada")
+    finally:
+        server.server_close()
+
+def load_queries(path: str) -> List[Dict]:
+    """Lê o arquivo de consultas do modo lote (lista JSON ou {"queries": [...]})"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    queries = data.get('queries', []) if isinstance(data, dict) else data
+    for position, query in enumerate(queries, 1):
+        if not isinstance(query, dict) or not query.get('city'):
+            raise ValueError(f"Consulta {position} de {path} sem o campo 'city'")
+    return queries
+
+
 def main():
     """Função principal com opções avançadas"""
     import sys
     
+    # Caminhos leves: não criam log em arquivo nem importam as dependências pesadas
+    if len(sys.argv) > 1 and sys.argv[1] in ('--help', '--list-sites'):
+        if sys.argv[1] == '--list-sites':
+            setup_logging(log_file=None)
+            HouseFinder().list_sites_status()
+            return
+        print("🏠 Buscador de Casas - São João del Rei")
+        print("\nOpções:")
+        print("  --enable-all    Habilita todos os sites (inclusive bloqueados)")
+        print("  --list-sites    Lista status de todos os sites")
+        print("  --serial        Busca um site por vez (sem paralelismo)")
+        print("  --max-pages N   Número máximo de páginas por site (padrão: 5)")
+        print("  --no-cache      Ignora o cache HTTP em disco")
+        print("  --incremental   Salva e mostra só anúncios novos ou com preço alterado")
+        print("  --enrich        Visita a página de cada anúncio (endereço, área, quartos)")
+        print("  --prometheus    Grava também casas_sjdr_metricas.prom (formato texto do Prometheus)")
+        print("  --http2         Usa HTTP/2 (requer httpx[http2]) para multiplexar as requisições por host")
+        print("  --parse-workers N Faz o parse das páginas em N processos (usa todos os núcleos)")
+        print("  --batch ARQ     Roda as consultas (cidade, bairros, faixa de preço) do arquivo JSON ARQ")
+        print("  --watch         Fica rodando e busca cada site de novo a cada --interval segundos")
+        print("  --interval S    Segundos entre as buscas de cada site no --watch (padrão: 900)")
+        print("  --notify DEST   Destino dos alertas do --watch: '-' (tela), arquivo .jsonl ou URL de webhook")
+        print("  --serve         API local de consulta sobre o histórico (casas_sjdr.db) na porta --port")
+        print("  --port N        Porta da API do --serve (padrão: 8765)")
+        print("  --cors ORIGEM   Libera a API do --serve para páginas de ORIGEM (ex.: http://localhost:3000)")
+        print("  --help          Mostra esta ajuda")
+        return
+    
+    setup_logging()
+    if '--serve' in sys.argv:
+        port = int(sys.argv[sys.argv.index('--port') + 1]) if '--port' in sys.argv else 8765
+        cors_origin = sys.argv[sys.argv.index('--cors') + 1] if '--cors' in sys.argv else None
+        serve_listings(ListingIndex(ListingStore()), port=port, cors_origin=cors_origin)
+        return
+    
     finder = HouseFinder()
     
     # Opções via linha de comando
-    if len(sys.argv) > 1:
-        if sys.argv[1] == '--enable-all':
-            for site_name in finder.sites.keys():
-                finder.enable_site(site_name)
-            print("🔓 Todos os sites habilitados (incluindo os com possíveis bloqueios)")
-        elif sys.argv[1] == '--list-sites':
-            finder.list_sites_status()
-            return
-        elif sys.argv[1] == '--help':
-            print("🏠 Buscador de Casas - São João del Rei")
-            print("\nOpções:")
-            print("  --enable-all    Habilita todos os sites (inclusive bloqueados)")
-            print("  --list-sites    Lista status de todos os sites")
-            print("  --help          Mostra esta ajuda")
-            return
+    if len(sys.argv) > 1 and sys.argv[1] == '--enable-all':
+        for site_name in finder.sites.keys():
+            finder.enable_site(site_name)
+        print("🔓 Todos os sites habilitados (incluindo os com possíveis bloqueios)")
+    
+    if '--serial' in sys.argv:
+        finder.max_workers = 1
+    if '--max-pages' in sys.argv:
+        finder.max_pages = int(sys.argv[sys.argv.index('--max-pages') + 1])
+    if '--no-cache' in sys.argv:
+        finder.cache = None
+    if '--enrich' in sys.argv:
+        finder.enrich_details = True
+    if '--prometheus' in sys.argv:
+        finder.prometheus_output = True
+    if '--http2' in sys.argv:
+        finder.http2 = True
+    if '--parse-workers' in sys.argv:
+        finder.parse_workers = int(sys.argv[sys.argv.index('--parse-workers') + 1])
+    
+    if '--interval' in sys.argv:
+        finder.watch_interval = float(sys.argv[sys.argv.index('--interval') + 1])
+    
+    if '--watch' in sys.argv:
+        target = sys.argv[sys.argv.index('--notify') + 1] if '--notify' in sys.argv else '-'
+        finder.watch(ChangeNotifier(target))
+        return
+    
+    if '--batch' in sys.argv:
+        finder.run_batch(load_queries(sys.argv[sys.argv.index('--batch') + 1]))
+        return
     
-    finder.run()
+    finder.run(incremental='--incremental' in sys.argv)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,52 @@
+"""Leitura de preços no formato brasileiro: parse_price (um texto) e normalize_prices (em lote)"""
+
+import math
+
+import pytest
+
+from house_finder_sjdr import normalize_prices, parse_price
+
+PRICE_CASES = [
+    ('R$ 1.234.567,89', 1234567.89),
+    ('R$ 350.000', 350000.0),
+    ('R$ 350.000,00', 350000.0),
+    ('200.000', 200000.0),
+    ('R$ 89,90', 89.9),
+    ('R$350000', 350000.0),
+    ('350 mil', 350000.0),
+    ('R$ 1,2 milhão', 1200000.0),
+    ('2 milhões', 2000000.0),
+    ('R$ 200.000 a R$ 250.000', 200000.0),
+    ('De R$ 300.000 até R$ 320.000', 300000.0),
+    ('Sob consulta', None),
+    ('Preço sob consulta', None),
+    ('', None),
+    (None, None),
+]
+
+
+@pytest.mark.parametrize('text, expected', PRICE_CASES)
+def test_parse_price(text, expected):
+    if expected is None:
+        assert parse_price(text) is None
+    else:
+        assert parse_price(text) == pytest.approx(expected)
+
+
+def test_normalize_prices_matches_parse_price():
+    texts = [text for text, _ in PRICE_CASES]
+    prices = normalize_prices(texts)
+    assert len(prices) == len(texts)
+    for text, price in zip(texts, prices):
+        expected = parse_price(text)
+        if expected is None:
+            assert math.isnan(price), text
+        else:
+            assert price == pytest.approx(expected), text
+
+
+def test_normalize_prices_keeps_numbers():
+    # Preços de dados estruturados (JSON embutido) já chegam como número
+    prices = normalize_prices([450000, 'R$ 300.000', 1.5e5, None])
+    assert prices[:3].tolist() == [450000.0, 300000.0, 150000.0]
+    assert math.isnan(prices[3])